@@ -0,0 +1,242 @@
+# ai_client.py - Shared async OpenRouter client
+#
+# `openai` and `httpx` are imported on first use: together they are about a
+# third of the app's import time, which a cold start on Render pays before
+# the port is bound.
+import asyncio
+import os
+import threading
+import time
+
+from metrics import LLM_FIRST_TOKEN, LLM_LATENCY, LLM_REQUESTS, LLM_RESILIENCE, LLM_TOKENS
+from model_router import router
+from resilience import LLM_STREAM_IDLE_TIMEOUT, DeadlineExceeded, policy_for
+from streaming import stream_completion_text
+
+# ============================================================================
+# HTTP CONNECTION POOL SETTINGS (override via environment)
+# ============================================================================
+HTTP2_ENABLED = os.environ.get("OPENROUTER_HTTP2", "1") == "1"
+MAX_CONNECTIONS = int(os.environ.get("OPENROUTER_MAX_CONNECTIONS", "100"))
+MAX_KEEPALIVE_CONNECTIONS = int(os.environ.get("OPENROUTER_MAX_KEEPALIVE", "20"))
+KEEPALIVE_EXPIRY = float(os.environ.get("OPENROUTER_KEEPALIVE_EXPIRY", "30"))
+CONNECT_TIMEOUT = float(os.environ.get("OPENROUTER_CONNECT_TIMEOUT", "5"))
+READ_TIMEOUT = float(os.environ.get("OPENROUTER_READ_TIMEOUT", "60"))
+POOL_TIMEOUT = float(os.environ.get("OPENROUTER_POOL_TIMEOUT", "10"))
+# The SDK default (2 retries with backoff) hides slow failures from the
+# circuit breaker; every call is bounded by its resilience.py deadline anyway
+MAX_RETRIES = int(os.environ.get("OPENROUTER_MAX_RETRIES", "1"))
+
+
+def _http2_available():
+    try:
+        import h2  # noqa: F401
+        return True
+    except ImportError:
+        return False
+
+
+def build_http_client():
+    """Create the single httpx pool shared by every OpenRouter call"""
+    import httpx
+
+    http2 = HTTP2_ENABLED and _http2_available()
+    if HTTP2_ENABLED and not http2:
+        print("⚠️ HTTP/2 requested but 'h2' is not installed - using HTTP/1.1")
+
+    return httpx.AsyncClient(
+        http2=http2,
+        limits=httpx.Limits(
+            max_connections=MAX_CONNECTIONS,
+            max_keepalive_connections=MAX_KEEPALIVE_CONNECTIONS,
+            keepalive_expiry=KEEPALIVE_EXPIRY,
+        ),
+        timeout=httpx.Timeout(
+            connect=CONNECT_TIMEOUT,
+            read=READ_TIMEOUT,
+            write=CONNECT_TIMEOUT,
+            pool=POOL_TIMEOUT,
+        ),
+    )
+
+
+def create_client(api_key, base_url, http_client=None):
+    """Return an AsyncOpenAI client for OpenRouter, or None without a key"""
+    if not api_key:
+        print("⚠️ OpenRouter client NOT initialized - AI features will use fallback")
+        return None
+
+    try:
+        from openai import AsyncOpenAI
+
+        client = AsyncOpenAI(
+            base_url=base_url,
+            api_key=api_key,
+            http_client=http_client or build_http_client(),
+            max_retries=MAX_RETRIES,
+        )
+        print("✅ OpenRouter client initialized successfully")
+        return client
+    except Exception as e:
+        print(f"❌ Error initializing OpenRouter client: {e}")
+        return None
+
+
+async def close_client(client):
+    """Release the pooled connections on shutdown"""
+    if client is not None:
+        await client.close()
+
+
+_UNSET = object()
+
+
+class LazyClient:
+    """
+    Stands in for the AsyncOpenAI client. The API key lookup runs the first
+    time the client is tested for truth; the `openai` import and connection
+    pool are built by get() or, ideally, ahead of traffic by warm().
+    """
+
+    def __init__(self, load_api_key, base_url):
+        self._load_api_key = load_api_key
+        self.base_url = base_url
+        self._api_key = _UNSET
+        self._client = None
+        self._http = None
+        self._lock = threading.RLock()
+
+    @property
+    def api_key(self):
+        if self._api_key is _UNSET:
+            with self._lock:
+                if self._api_key is _UNSET:
+                    self._api_key = self._load_api_key()
+        return self._api_key
+
+    def __bool__(self):
+        return bool(self.api_key)
+
+    def get(self):
+        """The AsyncOpenAI client, built on first call (None without a key)"""
+        if self._client is None and self:
+            with self._lock:
+                if self._client is None:
+                    self._http = build_http_client()
+                    self._client = create_client(self.api_key, self.base_url, http_client=self._http)
+        return self._client
+
+    async def warm(self):
+        """Build the client off the event loop and open the TLS connection"""
+        if not self:
+            return False
+        started = time.perf_counter()
+        if await asyncio.to_thread(self.get) is None:
+            return False
+        try:
+            # Any response will do: the connection stays in the keep-alive pool
+            await self._http.head(self.base_url)
+        except Exception as e:
+            print(f"⚠️ OpenRouter warmup request failed: {e}")
+        print(f"🔥 OpenRouter client warmed in {(time.perf_counter() - started) * 1000:.0f} ms")
+        return True
+
+    async def close(self):
+        await close_client(self._client)
+        self._client = self._http = None
+
+
+# ============================================================================
+# INSTRUMENTED CALLS
+# ============================================================================
+def _resolve(client):
+    return client.get() if isinstance(client, LazyClient) else client
+
+
+def _record_usage(endpoint, model, usage):
+    if usage is None:
+        return
+    LLM_TOKENS.inc(endpoint, model, "prompt", amount=usage.prompt_tokens or 0)
+    LLM_TOKENS.inc(endpoint, model, "completion", amount=usage.completion_tokens or 0)
+
+
+async def _create(client, endpoint, model, kwargs):
+    started = time.perf_counter()
+    outcome = "error"
+    try:
+        response = await client.chat.completions.create(**kwargs)
+        outcome = "ok"
+    except asyncio.CancelledError:
+        outcome = "cancelled"
+        raise
+    finally:
+        elapsed = time.perf_counter() - started
+        LLM_REQUESTS.inc(endpoint, model, outcome)
+        LLM_LATENCY.observe(elapsed, endpoint, model)
+        router.observe(endpoint, model, elapsed, outcome)
+
+    _record_usage(endpoint, model, getattr(response, "usage", None))
+    return response
+
+
+async def chat_completion(client, endpoint, **kwargs):
+    """
+    client.chat.completions.create() with latency, usage and error metrics,
+    bounded by the endpoint's deadline and circuit breaker (raises
+    resilience.UpstreamUnavailable) and hedged when it runs past its p95.
+    """
+    model = kwargs.get("model", "unknown")
+    client = _resolve(client)
+    return await policy_for(endpoint).call(lambda: _create(client, endpoint, model, kwargs))
+
+
+async def stream_chat_completion(client, endpoint, **kwargs):
+    """
+    Yield the text deltas of a streamed completion, with the same metrics.
+    The first token must arrive within the endpoint's deadline and each
+    later one within LLM_STREAM_IDLE_TIMEOUT; streams are never hedged.
+    """
+    policy = policy_for(endpoint)
+    policy.admit()
+    model = kwargs.get("model", "unknown")
+    started = time.perf_counter()
+    outcome = "error"
+    first_token = None
+    stream = None
+    try:
+        stream = await asyncio.wait_for(
+            _resolve(client).chat.completions.create(stream=True, **kwargs), policy.deadline)
+        chunks = stream_completion_text(stream).__aiter__()
+        timeout = max(0.0, policy.deadline - (time.perf_counter() - started))
+        while True:
+            try:
+                text = await asyncio.wait_for(chunks.__anext__(), timeout)
+            except StopAsyncIteration:
+                break
+            if first_token is None:
+                first_token = time.perf_counter() - started
+                LLM_FIRST_TOKEN.observe(first_token, endpoint, model)
+                timeout = LLM_STREAM_IDLE_TIMEOUT
+            yield text
+        outcome = "ok"
+    except asyncio.TimeoutError:
+        outcome = "timeout"
+        LLM_RESILIENCE.inc(endpoint, "deadline_exceeded")
+        raise DeadlineExceeded(f"{endpoint}: stream stalled") from None
+    except (asyncio.CancelledError, GeneratorExit):
+        outcome = "cancelled"
+        raise
+    finally:
+        elapsed = time.perf_counter() - started
+        LLM_REQUESTS.inc(endpoint, model, outcome)
+        LLM_LATENCY.observe(elapsed, endpoint, model)
+        router.observe(endpoint, model, first_token if first_token is not None else elapsed, outcome)
+        if outcome == "cancelled":
+            policy.breaker.release()
+        else:
+            policy.record(first_token if first_token is not None else elapsed, failed=outcome != "ok")
+        if stream is not None:
+            try:
+                await stream.close()
+            except Exception:
+                pass
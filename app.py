@@ -15,7 +15,6 @@ os.chdir(app_dir)
 # ============================================================================
 # NORMAL IMPORTS
 # ============================================================================
-import json
 # Add this near the top of app.py
 try:
     from pydantic import BaseModel
@@ -24,17 +23,42 @@ except ImportError:
     # Fallback for pydantic v1
     from pydantic import BaseModel
     PYDANTIC_V2 = False
+import asyncio
+from collections import deque
+from contextlib import asynccontextmanager
 from typing import List, Optional
-from fastapi import FastAPI, HTTPException, Depends
+from fastapi import FastAPI, HTTPException, Depends, Header
 from fastapi.middleware.cors import CORSMiddleware
-from sqlalchemy.orm import Session, sessionmaker
-from openai import OpenAI
-
-from database import Base, engine, get_db
+from fastapi.responses import PlainTextResponse
+from sqlalchemy import case, func, select, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from ai_client import LazyClient, chat_completion, stream_chat_completion
+from cache import USER_CACHE_VERIFY, fallback_cache, lesson_cache, lesson_key, user_cache
+from chat_sessions import CHAT_HISTORY_MESSAGES, chat_sessions
+from prompts import (build_assisted_lesson_messages, build_chat_messages, build_quiz_topup_messages,
+                     build_self_lesson_messages)
+from json_repair import parse_lenient, record_outcome, repair_stats, validate_question, validate_quiz
+from http_cache import PRIVATE_NO_CACHE, CachedJSON, conditional_response, etag_matches
+from serialization import DefaultJSONResponse, direct_json, dump_json
+from compression import CompressionMiddleware
+from singleflight import SingleFlight
+from trivia_pool import TriviaPool
+from prefetch import Prefetcher
+from model_router import DEFAULT_MODEL, router
+import resilience
+from resilience import UpstreamUnavailable
+from streaming import JsonStreamParser, ndjson_line, ndjson_response, sse_event, sse_response
+from metrics import FALLBACKS, HTTP_IN_FLIGHT, HTTP_REQUESTS, MetricsMiddleware, gauge_lines, registry
+from database import async_engine, engine, get_async_db, warm_database
+from migrations import run_migrations
+import passwords
+import tokens
 from models import (
-    UserDB, User,
+    UserDB, CompletedTopicDB, User,
     AuthRequest, SettingsRequest, XPRequest, BonusRequest,
-    DashboardRequest, LessonRequest, ChatRequest, TriviaRequest
+    DashboardRequest, LessonRequest, LessonBatchRequest, ChatRequest, ChatSessionRequest, TriviaRequest
 )
 
 # ============================================================================
@@ -91,28 +115,23 @@ def get_openrouter_key():
     print("   AI features will use fallback data")
     return None
 
-# Get the API key
-OPENROUTER_API_KEY = get_openrouter_key()
-OPENROUTER_BASE_URL = "https://openrouter.ai/api/v1"
-MODEL = "meta-llama/llama-3.1-8b-instruct"
+OPENROUTER_BASE_URL = os.environ.get("OPENROUTER_BASE_URL", "https://openrouter.ai/api/v1")
+# Models are picked per call by model_router (LLM_MODELS_<ENDPOINT>,
+# LLM_DEFAULT_MODEL); this is the default candidate everywhere
+MODEL = DEFAULT_MODEL
 
-# Initialize OpenRouter client if we have a key
-client = None
-if OPENROUTER_API_KEY:
-    try:
-        client = OpenAI(
-            base_url=OPENROUTER_BASE_URL,
-            api_key=OPENROUTER_API_KEY,
-        )
-        print("✅ OpenRouter client initialized successfully")
-    except Exception as e:
-        print(f"❌ Error initializing OpenRouter client: {e}")
-        client = None
-else:
-    print("⚠️ OpenRouter client NOT initialized - AI features will use fallback")
+# The async OpenRouter client (one shared connection pool). The key lookup,
+# `openai` import and pool are deferred so a cold start binds the port sooner.
+client = LazyClient(get_openrouter_key, OPENROUTER_BASE_URL)
 
-# Create tables
-Base.metadata.create_all(bind=engine)
+# Coalesces identical in-flight lesson generations
+ai_flights = SingleFlight()
+
+# Set to 0 when migrations run as their own deploy step (`python migrations.py`)
+RUN_MIGRATIONS_ON_STARTUP = os.environ.get("RUN_MIGRATIONS_ON_STARTUP", "1") == "1"
+# Open the DB pool and the OpenRouter TLS connection in the background
+WARMUP_ON_STARTUP = os.environ.get("WARMUP_ON_STARTUP", "1") == "1"
+WARMUP_IDLE_TIMEOUT = float(os.environ.get("WARMUP_IDLE_TIMEOUT", "2"))
 
 # ============================================================================
 # KEEP ALL YOUR EXISTING CODE BELOW - NO CHANGES NEEDED
@@ -121,7 +140,8 @@ Base.metadata.create_all(bind=engine)
 # ============================================================================
 def get_enhanced_fallback_lesson(topic, language):
     """Return an engaging fallback lesson with rich formatting"""
-    
+    FALLBACKS.inc("lesson")
+
     if language.lower() == "arabic":
         return {
             "lesson": f"""# 🎯 {topic}: دليل شامل للدراسة الذاتية
@@ -225,8 +245,33 @@ How do professionals use {topic} in their work?
 *✨ Keep up the amazing learning journey!*"""
         }
 
+def get_fallback_assisted_lesson(topic):
+    """Return the fallback assisted lesson with a 3-question quiz"""
+    FALLBACKS.inc("assisted_lesson")
+    return {
+        "lesson": f"This is a fallback lesson about {topic}.",
+        "quiz": [
+            {
+                "q": f"What is {topic}?",
+                "options": ["Option A", "Option B", "Option C", "Option D"],
+                "answer": "Option A"
+            },
+            {
+                "q": f"Why learn {topic}?",
+                "options": ["Reason 1", "Reason 2", "Reason 3", "All"],
+                "answer": "All"
+            },
+            {
+                "q": f"Where is {topic} used?",
+                "options": ["Everywhere", "Nowhere", "Somewhere", "Anywhere"],
+                "answer": "Everywhere"
+            }
+        ]
+    }
+
 def get_fallback_trivia(language):
     """Return fallback trivia questions in the specified language"""
+    FALLBACKS.inc("trivia")
     if language.lower() == "arabic":
         return {
             "quiz": [
@@ -288,7 +333,23 @@ def get_fallback_trivia(language):
             ]
         }
 
-def serialize_user(db_user: UserDB):
+async def get_completed_topics(db: AsyncSession, db_user: UserDB):
+    """Topics the user has completed in their current rank, oldest first"""
+    result = await db.execute(
+        select(CompletedTopicDB.topic)
+        .where(CompletedTopicDB.user_id == db_user.id, CompletedTopicDB.rank == db_user.rank)
+        .order_by(CompletedTopicDB.id)
+    )
+    return list(result.scalars())
+
+async def get_user_by_username(db: AsyncSession, username: str):
+    return await get_user(db, UserDB.username == username)
+
+async def get_user(db: AsyncSession, where):
+    result = await db.execute(select(UserDB).where(where))
+    return result.scalar_one_or_none()
+
+def serialize_user(db_user: UserDB, completed_topics: List[str]):
     return {
         "id": db_user.id,
         "username": db_user.username,
@@ -297,15 +358,76 @@ def serialize_user(db_user: UserDB):
         "level": db_user.level,
         "rank": db_user.rank,
         "topics_completed": db_user.topics_completed,
-        "completed_topics_in_rank": db_user.get_completed_topics(),
+        "completed_topics_in_rank": completed_topics,
         "school": db_user.school,
         "description": db_user.description,
+        "version": db_user.version,
     }
 
+def profile_etag(profile):
+    """users.version is bumped on every profile write, so it names the body"""
+    return f'"user-{profile["id"]}-v{profile["version"]}"'
+
+def cached_fallback(kind, key, build, if_none_match=None):
+    """Serve a fallback payload from its pre-serialized body, with ETag"""
+    cached = fallback_cache.get((kind,) + key)
+    if cached is None:
+        cached = CachedJSON(build())
+        fallback_cache.set((kind,) + key, cached)
+    else:
+        FALLBACKS.inc(kind)
+    return cached.response(if_none_match)
+
 # ============================================================================
 # FASTAPI APP
 # ============================================================================
-app = FastAPI()
+async def wait_until_idle(timeout=WARMUP_IDLE_TIMEOUT):
+    """
+    Hold warmup until the request that woke the instance has been answered
+    and nothing is in flight: on a fractional CPU it would only slow it down.
+    """
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + timeout
+    while loop.time() < deadline:
+        if HTTP_REQUESTS.total() > 0 and HTTP_IN_FLIGHT.total() == 0:
+            return
+        await asyncio.sleep(0.01)
+
+async def warm_up():
+    """Runs between the first requests: DB pool, hash workers, AI client"""
+    for step in (warm_database, passwords.warm, client.warm):
+        await wait_until_idle()
+        try:
+            await step()
+        except Exception as e:
+            print(f"⚠️ Warmup step {step.__qualname__} failed: {e}")
+    if client:
+        trivia_pool.start()
+        prefetcher.start()
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    if RUN_MIGRATIONS_ON_STARTUP:
+        # Create tables and migrate legacy data before serving
+        await asyncio.to_thread(run_migrations, engine)
+
+    warmup = None
+    if WARMUP_ON_STARTUP:
+        warmup = asyncio.create_task(warm_up())
+    elif client:
+        trivia_pool.start()
+        prefetcher.start()
+    yield
+    if warmup is not None:
+        warmup.cancel()
+        await asyncio.gather(warmup, return_exceptions=True)
+    await trivia_pool.stop()
+    await prefetcher.stop()
+    await client.close()
+    await async_engine.dispose()
+    passwords.shutdown()
+
+app = FastAPI(lifespan=lifespan, default_response_class=DefaultJSONResponse)
 app.add_middleware(
     CORSMiddleware,
     allow_origins=[
@@ -319,19 +441,53 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+app.add_middleware(CompressionMiddleware)
+app.add_middleware(MetricsMiddleware)
+
+# ============================================================================
+# SESSIONS
+# ============================================================================
+# When set, user routes no longer accept a bare username in the body
+AUTH_REQUIRE_TOKEN = os.environ.get("AUTH_REQUIRE_TOKEN", "0") == "1"
+
+def get_session(authorization: Optional[str] = Header(None)):
+    """Claims of the `Authorization: Bearer <token>` header, if one was sent"""
+    if not authorization:
+        return None
+    scheme, _, token = authorization.partition(" ")
+    if scheme.lower() != "bearer" or not token.strip():
+        raise HTTPException(status_code=401, detail="Invalid authorization header")
+    try:
+        return tokens.verify_token(token.strip())
+    except tokens.InvalidToken as e:
+        raise HTTPException(status_code=401, detail=f"Invalid session token: {e}")
+
+def user_lookup(session, username):
+    """
+    Row filter and cache key for the caller: the primary key from the
+    session token when one was sent, else the legacy username field.
+    """
+    if session:
+        return UserDB.id == session["uid"], session["usr"]
+    if username and not AUTH_REQUIRE_TOKEN:
+        return UserDB.username == username, username
+    raise HTTPException(status_code=401, detail="Not authenticated")
+
+def issue_session_token(user: UserDB):
+    return tokens.issue_token(user.id, user.username, user.rank)
 
 # ============================================================================
 # AUTH ROUTES
 # ============================================================================
 @app.post("/api/auth/signup")
-def signup(data: AuthRequest, db: Session = Depends(get_db)):
-    existing = db.query(UserDB).filter(UserDB.username == data.username).first()
+async def signup(data: AuthRequest, db: AsyncSession = Depends(get_async_db)):
+    existing = await get_user_by_username(db, data.username)
     if existing:
         raise HTTPException(status_code=400, detail="User already exists")
 
     new_user = UserDB(
         username=data.username,
-        password=data.password,
+        password=await passwords.hash_password(data.password),
         avatar="default_url",
         total_xp=0,
         level=1,
@@ -339,37 +495,81 @@ def signup(data: AuthRequest, db: Session = Depends(get_db)):
     )
 
     db.add(new_user)
-    db.commit()
-    db.refresh(new_user)
+    try:
+        await db.commit()
+    except IntegrityError:
+        # Lost a race with a concurrent signup for the same username
+        await db.rollback()
+        raise HTTPException(status_code=400, detail="User already exists")
+    await db.refresh(new_user)
 
-    return {"user": serialize_user(new_user), "message": "Success"}
+    profile = serialize_user(new_user, [])
+    user_cache.set(new_user.username, profile)
+    return {"user": profile, "token": issue_session_token(new_user), "message": "Success"}
 
 
 @app.post("/api/auth/signin")
-def signin(data: AuthRequest, db: Session = Depends(get_db)):
-    user = db.query(UserDB).filter(UserDB.username == data.username).first()
-    if not user or user.password != data.password:
+async def signin(data: AuthRequest, db: AsyncSession = Depends(get_async_db)):
+    snapshot = user_cache.snapshot()
+    user = await get_user_by_username(db, data.username)
+    if not user:
+        await passwords.verify_unknown_user(data.password)
+        raise HTTPException(status_code=400, detail="Invalid credentials")
+
+    ok, rehash = await passwords.verify_password(data.password, user.password)
+    if not ok:
         raise HTTPException(status_code=400, detail="Invalid credentials")
+    if rehash:
+        # Upgrade legacy plaintext (or old-cost) passwords on login
+        user.password = await passwords.hash_password(data.password)
+        await db.commit()
 
-    return {"user": serialize_user(user), "message": "Success"}
+    profile = serialize_user(user, await get_completed_topics(db, user))
+    user_cache.set(user.username, profile, snapshot)
+    return {"user": profile, "token": issue_session_token(user), "message": "Success"}
 
 # ============================================================================
 # USER DASHBOARD
 # ============================================================================
 @app.post("/api/user/dashboard")
-def dashboard(data: DashboardRequest, db: Session = Depends(get_db)):
-    user = db.query(UserDB).filter(UserDB.username == data.username).first()
-    if not user:
-        raise HTTPException(status_code=404, detail="User not found")
-
-    return {"user": serialize_user(user)}
+async def dashboard(data: DashboardRequest, db: AsyncSession = Depends(get_async_db),
+                    session: Optional[dict] = Depends(get_session),
+                    if_none_match: Optional[str] = Header(None)):
+    """Pollable: send the last ETag as If-None-Match to get a bodyless 304"""
+    where_user, cache_key = user_lookup(session, data.username)
+    profile = user_cache.get(cache_key)
+    if profile is not None and USER_CACHE_VERIFY:
+        # Another worker may have written the row since: every write bumps
+        # users.version, so one indexed read tells whether the copy is stale
+        version = await db.scalar(select(UserDB.version).where(where_user))
+        if version != profile["version"]:
+            user_cache.pop(cache_key)
+            profile = None
+    if profile is None:
+        snapshot = user_cache.snapshot()
+        user = await get_user(db, where_user)
+        if not user:
+            raise HTTPException(status_code=404, detail="User not found")
+
+        etag = profile_etag({"id": user.id, "version": user.version})
+        if etag_matches(if_none_match, etag):
+            # Unchanged since the client's copy: skip the topics query
+            return conditional_response(if_none_match, etag, cache_control=PRIVATE_NO_CACHE)
+
+        profile = serialize_user(user, await get_completed_topics(db, user))
+        user_cache.set(user.username, profile, snapshot)
+
+    return conditional_response(if_none_match, profile_etag(profile), cache_control=PRIVATE_NO_CACHE,
+                                build_body=lambda: dump_json({"user": profile}))
 
 # ============================================================================
 # USER SETTINGS
 # ============================================================================
 @app.post("/api/user/settings")
-def update_settings(data: SettingsRequest, db: Session = Depends(get_db)):
-    user = db.query(UserDB).filter(UserDB.username == data.username).first()
+async def update_settings(data: SettingsRequest, db: AsyncSession = Depends(get_async_db),
+                          session: Optional[dict] = Depends(get_session)):
+    where_user, _ = user_lookup(session, data.username)
+    user = await get_user(db, where_user)
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
 
@@ -380,313 +580,629 @@ def update_settings(data: SettingsRequest, db: Session = Depends(get_db)):
     if data.description:
         user.description = data.description
     if data.newPassword:
-        user.password = data.newPassword
+        user.password = await passwords.hash_password(data.newPassword)
+    user.version = UserDB.version + 1
 
-    db.commit()
-    return {"user": serialize_user(user), "message": "Updated"}
+    await db.commit()
+    snapshot = user_cache.snapshot()
+    await db.refresh(user)
+    profile = serialize_user(user, await get_completed_topics(db, user))
+    user_cache.set(user.username, profile, snapshot)
+    return {"user": profile, "message": "Updated"}
 
 # ============================================================================
 # GAME LOGIC: XP
 # ============================================================================
 RANKS = ["Beginner", "Rare", "Epic", "Mythic", "Legendary"]
 
-@app.post("/api/user/xp")
-def update_xp(data: XPRequest, db: Session = Depends(get_db)):
-    user = db.query(UserDB).filter(UserDB.username == data.username).first()
-    if not user:
-        raise HTTPException(status_code=404, detail="User not found")
-
-    # Increase XP
-    user.total_xp += data.score
+async def insert_ignoring_duplicates(db: AsyncSession, model, **values):
+    """INSERT ... ON CONFLICT DO NOTHING for SQLite and PostgreSQL"""
+    if db.bind.dialect.name == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert
+    else:
+        from sqlalchemy.dialects.sqlite import insert
+    await db.execute(insert(model).values(**values).on_conflict_do_nothing())
 
-    # Track topics
-    completed = user.get_completed_topics()
-    if data.topic not in completed:
-        completed.append(data.topic)
-    user.set_completed_topics(completed)
-    user.topics_completed = len(completed)
+def level_for_xp(total_xp):
+    """SQL expression for min(3, 1 + total_xp // 300)"""
+    return case((1 + total_xp / 300 > 3, 3), else_=1 + total_xp / 300)
 
-    # Rank Promotion
-    if len(completed) >= 10:
-        current_index = RANKS.index(user.rank)
-        if current_index < len(RANKS) - 1:
-            user.rank = RANKS[current_index + 1]
-            user.set_completed_topics([])
-            user.topics_completed = 0
+@app.post("/api/user/xp")
+async def update_xp(data: XPRequest, db: AsyncSession = Depends(get_async_db),
+                    session: Optional[dict] = Depends(get_session)):
+    where_user, cache_key = user_lookup(session, data.username)
+
+    # Increase XP and level in one statement. The row stays locked until
+    # commit, so concurrent awards for the same user are applied in turn.
+    result = await db.execute(
+        update(UserDB)
+        .where(where_user)
+        .values(
+            total_xp=UserDB.total_xp + data.score,
+            level=level_for_xp(UserDB.total_xp + data.score),
+            version=UserDB.version + 1,
+        )
+        .execution_options(synchronize_session=False)
+    )
+    if result.rowcount == 0:
+        await db.rollback()
+        raise HTTPException(status_code=404, detail="User not found")
 
-    # Level logic
-    user.level = min(3, 1 + user.total_xp // 300)
+    user_id, username, rank = (await db.execute(
+        select(UserDB.id, UserDB.username, UserDB.rank).where(where_user)
+    )).one()
+
+    # Track topics (indexed on user_id, rank, topic)
+    await insert_ignoring_duplicates(db, CompletedTopicDB, user_id=user_id, rank=rank, topic=data.topic)
+    completed_count = (await db.execute(
+        select(func.count(CompletedTopicDB.id))
+        .where(CompletedTopicDB.user_id == user_id, CompletedTopicDB.rank == rank)
+    )).scalar()
+
+    # Rank Promotion (topics of the previous rank stay as history); the
+    # rank condition makes the promotion fire at most once
+    current_index = RANKS.index(rank)
+    if completed_count >= 10 and current_index < len(RANKS) - 1:
+        await db.execute(
+            update(UserDB)
+            .where(UserDB.id == user_id, UserDB.rank == rank)
+            .values(rank=RANKS[current_index + 1], topics_completed=0)
+            .execution_options(synchronize_session=False)
+        )
+    else:
+        await db.execute(
+            update(UserDB)
+            .where(UserDB.id == user_id)
+            .values(topics_completed=completed_count)
+            .execution_options(synchronize_session=False)
+        )
 
-    db.commit()
+    new_xp, new_level, new_rank = (await db.execute(
+        select(UserDB.total_xp, UserDB.level, UserDB.rank).where(UserDB.id == user_id)
+    )).one()
+    await db.commit()
+    user_cache.pop(cache_key)
+    prefetcher.completed(user_id, data.topic, new_rank)
 
-    return {
+    response = {
         "message": "XP Updated",
-        "new_xp": user.total_xp,
-        "new_level": user.level,
-        "rank": user.rank
+        "new_xp": new_xp,
+        "new_level": new_level,
+        "rank": new_rank
     }
+    if new_rank != rank:
+        # The old token carries the previous rank
+        response["token"] = tokens.issue_token(user_id, username, new_rank)
+    return response
 
 # ============================================================================
 # BONUS XP
 # ============================================================================
 @app.post("/api/bonus")
-def bonus(data: BonusRequest, db: Session = Depends(get_db)):
-    user = db.query(UserDB).filter(UserDB.username == data.username).first()
-    if not user:
+async def bonus(data: BonusRequest, db: AsyncSession = Depends(get_async_db),
+                session: Optional[dict] = Depends(get_session)):
+    where_user, cache_key = user_lookup(session, data.username)
+
+    result = await db.execute(
+        update(UserDB)
+        .where(where_user)
+        .values(total_xp=UserDB.total_xp + data.score, version=UserDB.version + 1)
+        .execution_options(synchronize_session=False)
+    )
+    if result.rowcount == 0:
+        await db.rollback()
         raise HTTPException(status_code=404, detail="User not found")
 
-    user.total_xp += data.score
-    db.commit()
+    new_xp = (await db.execute(
+        select(UserDB.total_xp).where(where_user)
+    )).scalar()
+    await db.commit()
+    user_cache.pop(cache_key)
 
     return {
         "message": "Bonus Applied",
-        "new_xp": user.total_xp
+        "new_xp": new_xp
     }
 
 # ============================================================================
-# AI — ASSISTED LESSON (OpenRouter)
+# AI — JSON SALVAGE (repair rules live in json_repair.py)
 # ============================================================================
-@app.post("/api/lesson/assisted")
-def assisted_lesson(data: LessonRequest):
+ASSISTED_QUIZ_SIZE = 3
+TRIVIA_QUIZ_SIZE = 5
+
+async def top_up_quiz(quiz, size, language, topic=None, lesson=None):
+    """Ask the model for only the questions `quiz` is missing"""
+    missing = size - len(quiz)
+    if missing <= 0 or not client:
+        return quiz
     try:
-        print(f"🔍 DEBUG: Received lesson request - topic: {data.topic}, rank: {data.rank}")
-        
-        # Check if OpenRouter client is available
-        if not client:
-            print("❌ ERROR: OpenRouter client is not initialized")
-            raise HTTPException(status_code=500, detail="AI service not available")
-        
-        prompt = f"""You are an educational AI tutor. Create a short lesson about '{data.topic}' for a {data.rank} level student.
-
-LESSON REQUIREMENTS:
-- Create a brief, engaging lesson (2-3 paragraphs)
-- Include exactly 3 multiple-choice questions about the lesson
-- Difficulty level: {data.level}
-- Language: {data.language}
+        response = await chat_completion(
+            client, "quiz_topup",
+            model=router.choose("quiz_topup"),
+            messages=build_quiz_topup_messages("quiz_topup", missing, language, [q["q"] for q in quiz],
+                                               topic=topic, lesson=lesson),
+            temperature=0.7,
+            response_format={"type": "json_object"}
+        )
+        value, _ = parse_lenient(response.choices[0].message.content)
+        extra = validate_quiz(value.get("quiz") if isinstance(value, dict) else value)
+    except Exception as e:
+        print(f"⚠️ Quiz top-up failed: {e}")
+        return quiz
+    asked = {q["q"] for q in quiz}
+    return quiz + [q for q in extra if q["q"] not in asked][:missing]
 
-RESPONSE FORMAT - RETURN ONLY VALID JSON, NO OTHER TEXT:
-{{
-  "lesson": "Lesson content here...",
-  "quiz": [
-    {{
-      "q": "Question 1?",
-      "options": ["Option A", "Option B", "Option C", "Option D"],
-      "answer": "Option A"
-    }},
-    {{
-      "q": "Question 2?", 
-      "options": ["Option A", "Option B", "Option C", "Option D"],
-      "answer": "Option B"
-    }},
-    {{
-      "q": "Question 3?",
-      "options": ["Option A", "Option B", "Option C", "Option D"],
-      "answer": "Option C"
-    }}
-  ]
-}}
+async def salvage_quiz_payload(endpoint, model, text, size, language, topic=None, require_lesson=False):
+    """
+    {"lesson", "quiz"} (or {"quiz"}) from a completion that may need
+    repair, with invalid questions dropped and missing ones re-asked.
+    None if nothing usable is left and the fallback should be served.
+    """
+    try:
+        value, repairs = parse_lenient(text)
+    except ValueError as e:
+        print(f"❌ DEBUG: JSON parse error: {e}")
+        value, repairs = {}, ["unparseable"]
+    if isinstance(value, list):
+        value, repairs = {"quiz": value}, repairs + ["bare_list"]
+    elif not isinstance(value, dict):
+        value = {}
+
+    lesson = value.get("lesson")
+    has_lesson = isinstance(lesson, str) and bool(lesson.strip())
+    raw_quiz = value.get("quiz")
+    quiz = validate_quiz(raw_quiz)
+    clean = not repairs and quiz == raw_quiz and len(quiz) >= size and (has_lesson or not require_lesson)
+    router.record_json(endpoint, model, clean)
+    if repairs:
+        print(f"🔧 DEBUG: Repaired {endpoint} JSON: {', '.join(repairs)}")
+
+    if require_lesson and not has_lesson:
+        record_outcome(endpoint, "failed")
+        return None
+    outcome = "clean" if clean else "repaired"
+    if len(quiz) < size:
+        quiz = await top_up_quiz(quiz, size, language, topic=topic, lesson=lesson if has_lesson else None)
+        outcome = "topped_up" if len(quiz) >= size else "partial"
+    if not quiz:
+        record_outcome(endpoint, "failed")
+        return None
+    record_outcome(endpoint, outcome)
+    return {"lesson": lesson, "quiz": quiz} if require_lesson else {"quiz": quiz}
 
-IMPORTANT: Return ONLY the JSON object, no additional text or explanations."""
+# ============================================================================
+# AI — ASSISTED LESSON (OpenRouter)
+# ============================================================================
+def cached_lesson(cache_key, endpoint):
+    """Cached lesson or None; the prefetcher's own lookups don't count as reads"""
+    if endpoint.startswith("prefetch_"):
+        return lesson_cache.peek(cache_key)
+    cached = lesson_cache.get(cache_key)
+    if cached is not None:
+        prefetcher.claim(cache_key)
+    return cached
+
+async def generate_assisted_lesson(data: LessonRequest, endpoint="assisted_lesson"):
+    """Cached, coalesced assisted lesson; raises if the AI call fails"""
+    cache_key = lesson_key("assisted", data)
+    cached = cached_lesson(cache_key, endpoint)
+    if cached is not None:
+        return cached
+    
+    # Check if OpenRouter client is available
+    if not client:
+        print("❌ ERROR: OpenRouter client is not initialized")
+        raise HTTPException(status_code=500, detail="AI service not available")
+    
+    messages = build_assisted_lesson_messages(data)
 
+    async def generate():
         print("🔄 DEBUG: Sending request to OpenRouter API...")
-        
+        model = router.choose(endpoint)
+
         # OpenRouter API call
-        response = client.chat.completions.create(
-            model=MODEL,
-            messages=[
-                {"role": "system", "content": "You are an educational AI tutor that outputs only valid JSON."},
-                {"role": "user", "content": prompt}
-            ],
+        response = await chat_completion(
+            client, endpoint,
+            model=model,
+            messages=messages,
             temperature=0.7,
             response_format={"type": "json_object"}  # Request JSON response
         )
-        
+
         print(f"✅ DEBUG: OpenRouter response received")
-        
+
         # Get the response text
         response_text = response.choices[0].message.content
-        
+
         print(f"📝 DEBUG: Response text: {response_text}")
-        
-        # Clean the response
-        cleaned_text = response_text.strip()
-        
-        # Try to parse the response
-        try:
-            result = json.loads(cleaned_text)
-            print("✅ DEBUG: JSON parsed successfully")
-            return result
-        except json.JSONDecodeError as e:
-            print(f"❌ DEBUG: JSON parse error: {e}")
+
+        # Parse, repair and validate; missing questions are re-asked
+        result = await salvage_quiz_payload(endpoint, model, response_text, ASSISTED_QUIZ_SIZE,
+                                            data.language, topic=data.topic, require_lesson=True)
+        if result is None:
             # Return fallback data
-            return {
-                "lesson": f"This is a fallback lesson about {data.topic}.",
-                "quiz": [
-                    {
-                        "q": f"What is {data.topic}?",
-                        "options": ["Option A", "Option B", "Option C", "Option D"],
-                        "answer": "Option A"
-                    },
-                    {
-                        "q": f"Why learn {data.topic}?",
-                        "options": ["Reason 1", "Reason 2", "Reason 3", "All"],
-                        "answer": "All"
-                    },
-                    {
-                        "q": f"Where is {data.topic} used?",
-                        "options": ["Everywhere", "Nowhere", "Somewhere", "Anywhere"],
-                        "answer": "Everywhere"
-                    }
-                ]
-            }
-            
+            return get_fallback_assisted_lesson(data.topic)
+        if len(result["quiz"]) >= ASSISTED_QUIZ_SIZE:
+            lesson_cache.set(cache_key, result)
+        return result
+
+    # Identical concurrent requests share one upstream call
+    return await ai_flights.do(cache_key, generate)
+
+@app.post("/api/lesson/assisted")
+@direct_json
+async def assisted_lesson(data: LessonRequest):
+    try:
+        print(f"🔍 DEBUG: Received lesson request - topic: {data.topic}, rank: {data.rank}")
+        prefetcher.note_lesson("assisted", data)
+        return await generate_assisted_lesson(data)
+
+    except UpstreamUnavailable as e:
+        # Upstream too slow or circuit open: degrade instead of erroring
+        print(f"⚠️ Assisted lesson fallback: {e}")
+        return get_fallback_assisted_lesson(data.topic)
     except Exception as e:
         print(f"❌ DEBUG: Exception in assisted_lesson: {str(e)}")
         import traceback
         print(f"❌ DEBUG: Traceback: {traceback.format_exc()}")
         raise HTTPException(status_code=500, detail=f"AI service error: {str(e)}")
 
-# ============================================================================
-# AI — SELF-STUDY LESSON (OpenRouter)
-# ============================================================================
-@app.post("/api/lesson/self")
-def self_lesson(data: LessonRequest):
-    try:
-        print(f"🔍 DEBUG: Received self-learning request - topic: {data.topic}")
-        
-        if not client:
-            print("❌ ERROR: OpenRouter client is not initialized")
-            return get_enhanced_fallback_lesson(data.topic, data.language)
-        
-        prompt = f"""
-Create an engaging, interactive self-study lesson about '{data.topic}' in {data.language}.
+# Whole curriculum units in one request, streamed back as lessons finish
+ASSISTED_BATCH_MAX_ITEMS = int(os.environ.get("ASSISTED_BATCH_MAX_ITEMS", "20"))
+ASSISTED_BATCH_CONCURRENCY = int(os.environ.get("ASSISTED_BATCH_CONCURRENCY", "4"))
 
-STUDENT PROFILE:
-- Level: {data.rank}
-- Difficulty: {data.level}
-- Language: {data.language}
+@app.post("/api/lesson/assisted/batch")
+async def assisted_lesson_batch(data: LessonBatchRequest):
+    """
+    NDJSON, one line per lesson in completion order:
+    {"index", "topic", "status": "ok" | "fallback", "lesson": {...}}.
+    A failed item gets the same fallback structure as /api/lesson/assisted.
+    """
+    if not data.lessons:
+        raise HTTPException(status_code=422, detail="lessons must not be empty")
+    if len(data.lessons) > ASSISTED_BATCH_MAX_ITEMS:
+        raise HTTPException(status_code=422, detail=f"At most {ASSISTED_BATCH_MAX_ITEMS} lessons per batch")
+    print(f"🔍 DEBUG: Received lesson batch - {len(data.lessons)} topic(s)")
+    # A batch is a unit in teaching order: learn it for prefetch
+    prefetcher.note_sequence([item.topic for item in data.lessons])
+    for item in data.lessons:
+        prefetcher.note_lesson("assisted", item)
+
+    limit = asyncio.Semaphore(ASSISTED_BATCH_CONCURRENCY)
+
+    async def run(index, item):
+        async with limit:
+            try:
+                return index, "ok", await generate_assisted_lesson(item)
+            except Exception as e:
+                print(f"❌ DEBUG: Batch item {index} ({item.topic}) failed: {e}")
+                return index, "fallback", get_fallback_assisted_lesson(item.topic)
 
-LESSON REQUIREMENTS:
-1. Use RICH MARKDOWN formatting with headers, bullet points, tables, and emphasis
-2. Include interactive elements like "Try It Yourself" sections
-3. Add practical examples and real-world applications
-4. Include knowledge checks and reflection questions
-5. Make it visually appealing and easy to follow
+    async def lines():
+        tasks = [asyncio.ensure_future(run(i, item)) for i, item in enumerate(data.lessons)]
+        try:
+            for finished in asyncio.as_completed(tasks):
+                index, status, lesson = await finished
+                yield ndjson_line({"index": index, "topic": data.lessons[index].topic,
+                                   "status": status, "lesson": lesson})
+        finally:
+            # Client went away: stop generating the rest
+            for task in tasks:
+                task.cancel()
+
+    return ndjson_response(lines())
+
+def assisted_lesson_events(lesson):
+    """NDJSON events for a complete assisted lesson (cache hits)"""
+    yield ndjson_line({"event": "lesson", "lesson": lesson.get("lesson", "")})
+    for index, question in enumerate(lesson.get("quiz") or []):
+        yield ndjson_line({"event": "quiz", "index": index, "question": question})
+
+@app.post("/api/lesson/assisted/stream")
+async def assisted_lesson_stream(data: LessonRequest):
+    """
+    Same lesson as /api/lesson/assisted, as NDJSON events parsed from the
+    model's output while it is generated: {"event": "lesson"} as soon as
+    the lesson text is complete, then {"event": "quiz", "index", "question"}
+    per question, then {"event": "done"}. On failure a {"event": "fallback",
+    "lesson": {...}} replaces whatever was sent before it.
+    """
+    print(f"🔍 DEBUG: Received streaming lesson request - topic: {data.topic}")
+    prefetcher.note_lesson("assisted", data)
 
-FORMAT USING THIS MARKDOWN STRUCTURE:
-# 🎯 {data.topic}: Comprehensive Guide
+    cache_key = lesson_key("assisted", data)
+    cached = lesson_cache.get(cache_key)
+    if cached is not None:
+        prefetcher.claim(cache_key)
 
-## 📖 Introduction
-[Engaging introduction with emojis]
+    async def lines():
+        if cached is not None:
+            for line in assisted_lesson_events(cached):
+                yield line
+            yield ndjson_line({"event": "done"})
+            return
 
-## 🎓 Key Concepts
-### 🔍 Main Idea 1
-- **Explanation**: [Clear description]
-- **Example**: [Practical example]
-- **💡 Pro Tip**: [Helpful hint]
+        if not client:
+            yield ndjson_line({"event": "fallback", "lesson": get_fallback_assisted_lesson(data.topic)})
+            yield ndjson_line({"event": "done"})
+            return
+
+        endpoint = "assisted_lesson_stream"
+        model = router.choose(endpoint)
+        parser = JsonStreamParser()
+        lesson_sent = False
+        sent = []  # question texts already emitted, in order
+
+        def quiz_line(question):
+            sent.append(question["q"])
+            return ndjson_line({"event": "quiz", "index": len(sent) - 1, "question": question})
+
+        chunks = stream_chat_completion(
+            client, endpoint,
+            model=model,
+            messages=build_assisted_lesson_messages(data),
+            temperature=0.7,
+            response_format={"type": "json_object"},
+        )
+        try:
+            async for text in chunks:
+                for path, value in parser.feed(text):
+                    if path == ("lesson",) and isinstance(value, str) and value.strip():
+                        lesson_sent = True
+                        yield ndjson_line({"event": "lesson", "lesson": value})
+                    elif len(path) == 2 and path[0] == "quiz":
+                        # Only questions that fit the schema are sent early
+                        question = validate_question(value)
+                        if question is not None and question["q"] not in sent:
+                            yield quiz_line(question)
+        except Exception as e:
+            # Keep what was generated before the failure for salvage
+            print(f"❌ DEBUG: Exception in assisted_lesson_stream: {str(e)}")
+        finally:
+            # Release the upstream stream now rather than at garbage collection
+            await chunks.aclose()
+
+        result = None
+        if parser.text.strip():
+            result = await salvage_quiz_payload(endpoint, model, parser.text, ASSISTED_QUIZ_SIZE,
+                                                data.language, topic=data.topic, require_lesson=True)
+        if result is None:
+            # The fallback lesson replaces whatever was sent so far
+            yield ndjson_line({"event": "fallback", "lesson": get_fallback_assisted_lesson(data.topic)})
+        else:
+            if not lesson_sent:
+                yield ndjson_line({"event": "lesson", "lesson": result["lesson"]})
+            for question in result["quiz"]:
+                if question["q"] not in sent:
+                    yield quiz_line(question)
+            if len(result["quiz"]) >= ASSISTED_QUIZ_SIZE:
+                lesson_cache.set(cache_key, result)
 
-### 🔍 Main Idea 2  
-- **Explanation**: [Clear description]
-- **Example**: [Practical example]
-- **💡 Pro Tip**: [Helpful hint]
+        yield ndjson_line({"event": "done"})
 
-## 🛠️ Practical Application
-### 🎯 Try It Yourself
-[Interactive exercise or thought experiment]
+    return ndjson_response(lines())
 
-### 🌍 Real-World Example
-[How this is used in real life]
+# ============================================================================
+# AI — CHAT TURNS (prompt text lives in prompts.py)
+# ============================================================================
+CHAT_UNAVAILABLE_REPLY = "AI service is currently unavailable. Please try again later."
+CHAT_ERROR_REPLY = "I'm having trouble responding right now. Please try asking your question again in a moment."
 
-## 📊 Quick Reference
-| Concept | Definition | Example |
-|---------|------------|---------|
-[Table with key concepts]
+# Legacy transcripts label turns by author; anything else is the student
+CHAT_ASSISTANT_AUTHORS = {"ai", "assistant", "bot", "tutor"}
 
-## 🤔 Knowledge Check
-### ❓ Reflection Questions
-1. [Thought-provoking question 1]
-2. [Thought-provoking question 2]
+def start_chat_turn(data: ChatRequest):
+    """
+    Model messages for a chat request, plus the server-side session the
+    turn belongs to (None for legacy requests carrying the full transcript).
+    """
+    if data.sessionId:
+        session = chat_sessions.get(data.sessionId)
+        if session is None:
+            raise HTTPException(status_code=404, detail="Chat session not found or expired")
+        if not data.message:
+            raise HTTPException(status_code=422, detail="message is required with sessionId")
+        messages = build_chat_messages(session.lesson_content, session.language, session.history, data.message)
+        return messages, session
+
+    transcript = data.messages or []
+    message = transcript[-1].content if transcript else (data.message or "Hello")
+    history = deque((
+        {"role": "assistant" if m.author.lower() in CHAT_ASSISTANT_AUTHORS else "user", "content": m.content}
+        for m in transcript[:-1]
+    ), maxlen=CHAT_HISTORY_MESSAGES)
+    return build_chat_messages(data.lessonContent, data.language or "English", history, message), None
+
+def chat_result(reply, session=None):
+    if session is None:
+        return {"reply": reply}
+    return {"reply": reply, "sessionId": session.id}
 
-### 🎯 Self-Assessment
-- [ ] I understand the basic concepts
-- [ ] I can explain it to someone else  
-- [ ] I can apply it in practice
 
-## 🚀 Next Steps
-[Suggestions for further learning]
+# ============================================================================
+# AI — SELF-STUDY LESSON (OpenRouter)
+# ============================================================================
+def fallback_lesson_response(data: LessonRequest, if_none_match=None):
+    return cached_fallback(
+        "lesson", (data.topic, data.language.lower()),
+        lambda: get_enhanced_fallback_lesson(data.topic, data.language), if_none_match,
+    )
+
+async def generate_self_lesson(data: LessonRequest, endpoint="self_lesson"):
+    """Cached, coalesced self-study lesson; raises if the AI call fails"""
+    cache_key = lesson_key("self", data)
+    cached = cached_lesson(cache_key, endpoint)
+    if cached is not None:
+        return cached
 
-Make the lesson engaging, use emojis appropriately, and include interactive elements throughout.
-"""
+    messages = build_self_lesson_messages(data)
 
+    async def generate():
         print("🔄 DEBUG: Sending self-learning request to OpenRouter API...")
-        
-        response = client.chat.completions.create(
-            model=MODEL,
-            messages=[
-                {"role": "system", "content": "You are an educational AI tutor that creates engaging lessons."},
-                {"role": "user", "content": prompt}
-            ],
+
+        response = await chat_completion(
+            client, endpoint,
+            model=router.choose(endpoint),
+            messages=messages,
             temperature=0.8,
         )
-        
+
         lesson_content = response.choices[0].message.content
-        return {"lesson": lesson_content}
+        result = {"lesson": lesson_content}
+        lesson_cache.set(cache_key, result)
+        return result
+
+    return await ai_flights.do(cache_key, generate)
+
+@app.post("/api/lesson/self")
+@direct_json
+async def self_lesson(data: LessonRequest, if_none_match: Optional[str] = Header(None)):
+    try:
+        print(f"🔍 DEBUG: Received self-learning request - topic: {data.topic}")
+        prefetcher.note_lesson("self", data)
+
+        if not client and lesson_key("self", data) not in lesson_cache:
+            print("❌ ERROR: OpenRouter client is not initialized")
+            return fallback_lesson_response(data, if_none_match)
+
+        return await generate_self_lesson(data)
             
     except Exception as e:
         print(f"❌ DEBUG: Exception in self_lesson: {str(e)}")
-        return get_enhanced_fallback_lesson(data.topic, data.language)
+        return fallback_lesson_response(data, if_none_match)
+
+@app.post("/api/lesson/self/stream")
+async def self_lesson_stream(data: LessonRequest):
+    """Same lesson as /api/lesson/self, streamed as SSE `token` events"""
+    print(f"🔍 DEBUG: Received streaming self-learning request - topic: {data.topic}")
+    prefetcher.note_lesson("self", data)
+
+    cache_key = lesson_key("self", data)
+    cached = lesson_cache.get(cache_key)
+    if cached is not None:
+        prefetcher.claim(cache_key)
+
+    async def events():
+        if cached is not None:
+            yield sse_event({"text": cached["lesson"]}, event="token")
+            yield sse_event({}, event="done")
+            return
+
+        if not client:
+            yield sse_event(get_enhanced_fallback_lesson(data.topic, data.language), event="fallback")
+            yield sse_event({}, event="done")
+            return
+
+        parts = []
+        try:
+            async for text in stream_chat_completion(
+                client, "self_lesson_stream",
+                model=router.choose("self_lesson_stream"),
+                messages=build_self_lesson_messages(data),
+                temperature=0.8,
+            ):
+                parts.append(text)
+                yield sse_event({"text": text}, event="token")
+            if not parts:
+                raise ValueError("empty completion stream")
+        except Exception as e:
+            print(f"❌ DEBUG: Exception in self_lesson_stream: {str(e)}")
+            # The fallback lesson replaces whatever was streamed so far
+            yield sse_event(get_enhanced_fallback_lesson(data.topic, data.language), event="fallback")
+        else:
+            lesson_cache.set(cache_key, {"lesson": "".join(parts)})
+
+        yield sse_event({}, event="done")
+
+    return sse_response(events())
 
 # ============================================================================
 # AI — CHAT TUTOR (OpenRouter)
 # ============================================================================
+@app.post("/api/chat/session")
+def create_chat_session(data: ChatSessionRequest):
+    """Upload the lesson context once; later turns send only sessionId + message"""
+    session = chat_sessions.create(data.lessonContent, data.language)
+    return {"sessionId": session.id, "expiresIn": int(chat_sessions.ttl),
+            "maxHistory": session.history.maxlen}
+
+@app.delete("/api/chat/session/{session_id}")
+def delete_chat_session(session_id: str):
+    if not chat_sessions.delete(session_id):
+        raise HTTPException(status_code=404, detail="Chat session not found or expired")
+    return {"message": "Deleted"}
+
 @app.post("/api/chat")
-def chat(data: ChatRequest):
+@direct_json
+async def chat(data: ChatRequest):
+    messages, session = start_chat_turn(data)
     try:
         print("🔍 DEBUG: Received chat request")
         
         if not client:
-            return {"reply": "AI service is currently unavailable. Please try again later."}
-        
-        last_msg = data.messages[-1].content if data.messages and len(data.messages) > 0 else "Hello"
+            FALLBACKS.inc("chat")
+            return chat_result(CHAT_UNAVAILABLE_REPLY, session)
 
-        prompt = f"""
-You are a friendly and helpful tutor. Use this lesson for context:
-{data.lessonContent if data.lessonContent else "No specific lesson context provided."}
-
-Student's message: "{last_msg}"
-Language: {data.language}
-
-Provide a helpful, educational response. Keep it clear and engaging.
-"""
-
-        response = client.chat.completions.create(
-            model=MODEL,
-            messages=[
-                {"role": "system", "content": "You are a friendly educational tutor."},
-                {"role": "user", "content": prompt}
-            ],
+        response = await chat_completion(
+            client, "chat",
+            model=router.choose("chat"),
+            messages=messages,
             temperature=0.7,
         )
         
-        return {"reply": response.choices[0].message.content}
+        reply = response.choices[0].message.content
+        if session is not None:
+            session.add_turn(data.message, reply)
+        return chat_result(reply, session)
         
     except Exception as e:
         print(f"❌ DEBUG: Exception in chat: {str(e)}")
-        return {"reply": "I'm having trouble responding right now. Please try asking your question again in a moment."}
+        FALLBACKS.inc("chat")
+        return chat_result(CHAT_ERROR_REPLY, session)
+
+@app.post("/api/chat/stream")
+async def chat_stream(data: ChatRequest):
+    """Same reply as /api/chat, streamed as SSE `token` events"""
+    print("🔍 DEBUG: Received streaming chat request")
+    messages, session = start_chat_turn(data)
+
+    async def events():
+        if not client:
+            FALLBACKS.inc("chat")
+            yield sse_event(chat_result(CHAT_UNAVAILABLE_REPLY, session), event="fallback")
+            yield sse_event({}, event="done")
+            return
+
+        parts = []
+        try:
+            async for text in stream_chat_completion(
+                client, "chat_stream",
+                model=router.choose("chat_stream"),
+                messages=messages,
+                temperature=0.7,
+            ):
+                parts.append(text)
+                yield sse_event({"text": text}, event="token")
+            if not parts:
+                raise ValueError("empty completion stream")
+            if session is not None:
+                session.add_turn(data.message, "".join(parts))
+        except Exception as e:
+            print(f"❌ DEBUG: Exception in chat_stream: {str(e)}")
+            FALLBACKS.inc("chat")
+            yield sse_event(chat_result(CHAT_ERROR_REPLY, session), event="fallback")
+
+        yield sse_event({} if session is None else {"sessionId": session.id}, event="done")
+
+    return sse_response(events())
 
 # ============================================================================
 # AI — TRIVIA (OpenRouter)
 # ============================================================================
-@app.post("/api/trivia")
-def trivia(data: TriviaRequest):
-    try:
-        print(f"🔍 DEBUG: Received trivia request - language: {data.language}")
-        
-        if not client:
-            return get_fallback_trivia(data.language)
-        
-        if data.language.lower() == "arabic":
-            prompt = """أنشئ 5 أسئلة trivial ممتعة وتعليمية.
+async def generate_trivia(language):
+    """Ask the model for one 5-question trivia payload in `language`"""
+    if language.lower() == "arabic":
+        prompt = """أنشئ 5 أسئلة trivial ممتعة وتعليمية.
 
 أعد JSON فقط:
 {{
@@ -699,8 +1215,8 @@ def trivia(data: TriviaRequest):
     // 4 أسئلة أخرى
   ]
 }}"""
-        else:
-            prompt = f"""Generate 5 trivia questions in {data.language}.
+    else:
+        prompt = f"""Generate 5 trivia questions in {language}.
 
 Return ONLY JSON:
 {{
@@ -714,23 +1230,40 @@ Return ONLY JSON:
   ]
 }}"""
 
-        response = client.chat.completions.create(
-            model=MODEL,
-            messages=[
-                {"role": "system", "content": "You output only valid JSON."},
-                {"role": "user", "content": prompt}
-            ],
-            temperature=0.7,
-            response_format={"type": "json_object"}
-        )
-        
-        response_text = response.choices[0].message.content
-        result = json.loads(response_text)
-        return result
-            
-    except Exception as e:
-        print(f"❌ DEBUG: Exception in trivia: {str(e)}")
-        return get_fallback_trivia(data.language)
+    model = router.choose("trivia")
+    response = await chat_completion(
+        client, "trivia",
+        model=model,
+        messages=[
+            {"role": "system", "content": "You output only valid JSON."},
+            {"role": "user", "content": prompt}
+        ],
+        temperature=0.7,
+        response_format={"type": "json_object"}
+    )
+
+    response_text = response.choices[0].message.content
+    quiz = await salvage_quiz_payload("trivia", model, response_text, TRIVIA_QUIZ_SIZE, language)
+    if quiz is None:
+        raise ValueError("no usable trivia questions in completion")
+    return quiz
+
+# Requests are served from this pool; generation happens in the background
+trivia_pool = TriviaPool(generate_trivia)
+
+# Generates the lesson a student will most likely open next
+prefetcher = Prefetcher({"assisted": generate_assisted_lesson, "self": generate_self_lesson})
+
+@app.post("/api/trivia")
+@direct_json
+async def trivia(data: TriviaRequest, if_none_match: Optional[str] = Header(None)):
+    print(f"🔍 DEBUG: Received trivia request - language: {data.language}")
+
+    quiz = trivia_pool.take(data.language)
+    if quiz is None:
+        language = data.language.lower()
+        return cached_fallback("trivia", (language,), lambda: get_fallback_trivia(language), if_none_match)
+    return quiz
 
 # ============================================================================
 # ABOUT INFORMATION
@@ -747,51 +1280,113 @@ class AboutResponse(BaseModel):
     school_description: str
     team: List[TeamMember]
 
+# The about page and system routes never change while the process runs:
+# serialize them once and let clients revalidate with If-None-Match
+STATIC_CACHE_CONTROL = "public, max-age=3600"
+
+ABOUT_TEAM = [
+    {"name": "Mr. Bassem Bin Salah", "role": "Super Teacher 🎓", "photo": "https://api.multiavatar.com/Teacher.svg"},
+    {"name": "Alex", "role": "Code Wizard 💻", "photo": "https://api.multiavatar.com/Alex.svg"},
+    {"name": "Sarah", "role": "Design Artist 🎨", "photo": "https://api.multiavatar.com/Sarah.svg"},
+    {"name": "Omar", "role": "Bug Hunter 🐞", "photo": "https://api.multiavatar.com/Omar.svg"},
+    {"name": "Lina", "role": "Storyteller 📚", "photo": "https://api.multiavatar.com/Lina.svg"}
+]
+
+ABOUT_DESCRIPTIONS = {
+    "ar": "مدرستنا مخصصة لجعل التعلم تجربة سحرية من خلال منصة تعليمية مدعومة بالذكاء الاصطناعي. نحن نؤمن بقوة التعليم التفاعلي والتكنولوجيا في تحفيز العقول الشابة.",
+    "en": "Our school is dedicated to making learning a magical experience through AI-powered education. We believe in the power of interactive learning and technology to inspire young minds.",
+}
+
+def build_about(language):
+    # Validated once against the response model, then served pre-serialized
+    AboutResponse(school_description=ABOUT_DESCRIPTIONS[language], team=ABOUT_TEAM)
+    return CachedJSON({"school_description": ABOUT_DESCRIPTIONS[language], "team": ABOUT_TEAM},
+                      cache_control=STATIC_CACHE_CONTROL)
+
+ABOUT_RESPONSES = {language: build_about(language) for language in ABOUT_DESCRIPTIONS}
+
 @app.post("/api/about", response_model=AboutResponse)
-def get_about_info(data: AboutRequest):
-    # Team data with Multiavatar URLs - exactly matching your frontend fallback
-    team_data = [
-        {"name": "Mr. Bassem Bin Salah", "role": "Super Teacher 🎓", "photo": "https://api.multiavatar.com/Teacher.svg"},
-        {"name": "Alex", "role": "Code Wizard 💻", "photo": "https://api.multiavatar.com/Alex.svg"},
-        {"name": "Sarah", "role": "Design Artist 🎨", "photo": "https://api.multiavatar.com/Sarah.svg"},
-        {"name": "Omar", "role": "Bug Hunter 🐞", "photo": "https://api.multiavatar.com/Omar.svg"},
-        {"name": "Lina", "role": "Storyteller 📚", "photo": "https://api.multiavatar.com/Lina.svg"}
-    ]
-    
-    # Language-specific descriptions
-    if data.language == "ar":
-        description = "مدرستنا مخصصة لجعل التعلم تجربة سحرية من خلال منصة تعليمية مدعومة بالذكاء الاصطناعي. نحن نؤمن بقوة التعليم التفاعلي والتكنولوجيا في تحفيز العقول الشابة."
-    else:
-        description = "Our school is dedicated to making learning a magical experience through AI-powered education. We believe in the power of interactive learning and technology to inspire young minds."
-    
-    return AboutResponse(
-        school_description=description,
-        team=team_data
-    )
+def get_about_info(data: AboutRequest, if_none_match: Optional[str] = Header(None)):
+    about = ABOUT_RESPONSES["ar" if data.language == "ar" else "en"]
+    return about.response(if_none_match)
 
 # ============================================================================
 # SYSTEM TEST
 # ============================================================================
+# Health checks must reach the app, so this one always revalidates
+TEST_RESPONSE = CachedJSON({"message": "pong", "status": "healthy", "ai_provider": "OpenRouter"})
+
 @app.get("/api/test")
-def test():
-    return {"message": "pong", "status": "healthy", "ai_provider": "OpenRouter"}
+def test(if_none_match: Optional[str] = Header(None)):
+    return TEST_RESPONSE.response(if_none_match)
+
+@app.get("/api/cache/stats")
+def cache_stats():
+    return {"lessons": lesson_cache.stats(), "users": user_cache.stats(), "fallbacks": fallback_cache.stats(),
+            "chat_sessions": chat_sessions.stats(), "coalescing": ai_flights.stats(), "trivia_pool": trivia_pool.stats(),
+            "prefetch": prefetcher.stats(), "upstream": resilience.stats(),
+            "json_repair": repair_stats()}
+
+@app.get("/api/models/routing")
+def model_routing():
+    """Candidates, latency target, recent stats and decisions per endpoint"""
+    return {"default": MODEL, "endpoints": router.stats()}
+
+def collect_runtime_gauges():
+    """Cache, coalescing and trivia-pool counters, read at scrape time"""
+    caches = [lesson_cache.stats(), user_cache.stats(), fallback_cache.stats(), chat_sessions.stats()]
+    flights = ai_flights.stats()
+    pool = trivia_pool.stats()
+    lines = []
+    for field in ("size", "hits", "misses"):
+        lines += gauge_lines(f"cache_{field}", f"In-process cache {field}",
+                             [((c["name"],), c[field]) for c in caches], ("cache",))
+    lines += gauge_lines("llm_coalesced_total", "Callers that joined an in-flight AI call",
+                         [((), flights["coalesced"])])
+    lines += gauge_lines("llm_in_flight", "Distinct AI calls currently in flight",
+                         [((), flights["in_flight"])])
+    lines += gauge_lines("trivia_pool_size", "Pre-generated trivia sets ready to serve",
+                         [((language,), size) for language, size in pool["sizes"].items()], ("language",))
+    for field in ("served", "empty", "generated", "failed"):
+        lines += gauge_lines(f"trivia_pool_{field}", f"Trivia pool {field} count", [((), pool[field])])
+    prefetch = prefetcher.stats()
+    lines += gauge_lines("prefetch_queued", "Speculative lessons waiting to be generated", [((), prefetch["queued"])])
+    lines += gauge_lines("prefetch_hit_rate", "Prefetched lessons later requested / generated",
+                         [((), prefetch["hit_rate"])])
+    return lines
+
+registry.add_collector(collect_runtime_gauges)
+
+@app.get("/metrics")
+def metrics():
+    return PlainTextResponse(registry.render(), media_type="text/plain; version=0.0.4")
+
+ROOT_RESPONSE = CachedJSON({
+    "message": "LearnSphere Backend API",
+    "status": "running",
+    "version": "1.0.0",
+    "endpoints": [
+        "/api/test - Health check",
+        "/api/auth/signup - User registration",
+        "/api/auth/signin - User login",
+        "/api/lesson/assisted - AI-assisted lessons",
+        "/api/lesson/assisted/batch - Several assisted lessons (NDJSON)",
+        "/api/lesson/assisted/stream - Assisted lesson, then quiz items as generated (NDJSON)",
+        "/api/lesson/self - Self-study lessons",
+        "/api/lesson/self/stream - Self-study lessons (SSE)",
+        "/api/chat/session - Start a server-side chat session",
+        "/api/chat - AI chat tutor",
+        "/api/chat/stream - AI chat tutor (SSE)",
+        "/api/trivia - Fun trivia",
+        "/api/cache/stats - Cache hit/miss counters",
+        "/api/models/routing - Model routing decisions",
+        "/metrics - Prometheus metrics"
+    ]
+}, cache_control=STATIC_CACHE_CONTROL)
 
 @app.get("/")
-def root():
-    return {
-        "message": "LearnSphere Backend API",
-        "status": "running",
-        "version": "1.0.0",
-        "endpoints": [
-            "/api/test - Health check",
-            "/api/auth/signup - User registration",
-            "/api/auth/signin - User login",
-            "/api/lesson/assisted - AI-assisted lessons",
-            "/api/lesson/self - Self-study lessons",
-            "/api/chat - AI chat tutor",
-            "/api/trivia - Fun trivia"
-        ]
-    }
+def root(if_none_match: Optional[str] = Header(None)):
+    return ROOT_RESPONSE.response(if_none_match)
 
 # ============================================================================
 # PYTHONANYWHERE WSGI COMPATIBILITY
@@ -0,0 +1,73 @@
+# bench/_server.py - Boot the app under uvicorn in a subprocess for benchmarks
+import contextlib
+import os
+import socket
+import subprocess
+import sys
+import time
+
+import httpx
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def wait_until_up(base_url, timeout=30.0, path="/api/test"):
+    """Poll until the server answers; returns seconds waited"""
+    started = time.perf_counter()
+    while True:
+        try:
+            if httpx.get(base_url + path, timeout=1.0).status_code == 200:
+                return time.perf_counter() - started
+        except httpx.HTTPError:
+            pass
+        if time.perf_counter() - started > timeout:
+            raise RuntimeError(f"server at {base_url} did not come up in {timeout}s")
+        time.sleep(0.05)
+
+
+@contextlib.contextmanager
+def run_process(cmd, base_url, env=None, quiet=True, health_path="/api/test"):
+    """Start `cmd`, wait until `base_url + health_path` answers, yield base_url"""
+    proc = subprocess.Popen(
+        cmd,
+        cwd=REPO_DIR,
+        env={**os.environ, **(env or {})},
+        stdout=subprocess.DEVNULL if quiet else None,
+        stderr=subprocess.DEVNULL if quiet else None,
+    )
+    try:
+        wait_until_up(base_url, path=health_path)
+        yield base_url
+    finally:
+        proc.terminate()
+        try:
+            proc.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            proc.kill()
+
+
+def run_app(env=None, workers=1, quiet=True):
+    """Run `uvicorn app:app` on a free port and yield its base URL"""
+    port = free_port()
+    cmd = [sys.executable, "-m", "uvicorn", "app:app", "--host", "127.0.0.1",
+           "--port", str(port), "--workers", str(workers), "--log-level", "warning"]
+    return run_process(cmd, f"http://127.0.0.1:{port}", env=env, quiet=quiet)
+
+
+def run_fake_openrouter(latency_ms=500, jitter_ms=200, error_rate=0.0, tokens_per_second=200,
+                        stall_rate=0.0, stall_ms=60000, model_latency_ms="",
+                        malformed_rate=0.0, quiet=True):
+    """Run bench/fake_openrouter.py on a free port and yield its base URL"""
+    port = free_port()
+    cmd = [sys.executable, os.path.join(REPO_DIR, "bench", "fake_openrouter.py"),
+           "--port", str(port), "--latency-ms", str(latency_ms), "--jitter-ms", str(jitter_ms),
+           "--error-rate", str(error_rate), "--tokens-per-second", str(tokens_per_second),
+           "--stall-rate", str(stall_rate), "--stall-ms", str(stall_ms),
+           "--model-latency-ms", model_latency_ms, "--malformed-rate", str(malformed_rate)]
+    return run_process(cmd, f"http://127.0.0.1:{port}", quiet=quiet, health_path="/models")
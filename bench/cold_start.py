@@ -0,0 +1,105 @@
+# bench/cold_start.py - Time from process start to first responses
+#
+# Starts uvicorn repeatedly against a fresh SQLite file and a local OpenRouter
+# stand-in, and measures for each boot:
+#   import     - `import app` alone, in a separate interpreter
+#   first_ping - spawn until GET /api/test answers (port bound, app ready)
+#   first_db   - spawn until a DB-backed request (signup) has answered
+#   first_ai   - spawn until a chat completion has answered
+#
+#   python bench/cold_start.py --runs 5
+#   python bench/cold_start.py --runs 5 --env WARMUP_ON_STARTUP=0
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import uuid
+
+import httpx
+
+from _server import REPO_DIR, free_port, run_fake_openrouter
+
+CHAT_BODY = {"lessonContent": "Fractions", "messages": [{"author": "user", "content": "Hi"}],
+             "language": "English"}
+
+
+def time_import(env):
+    code = "import time; t = time.perf_counter(); import app; print(time.perf_counter() - t)"
+    out = subprocess.run([sys.executable, "-c", code], cwd=REPO_DIR, env={**os.environ, **env},
+                         capture_output=True, text=True, check=True).stdout
+    return float(out.strip().splitlines()[-1])
+
+
+def boot_once(env):
+    port = free_port()
+    base_url = f"http://127.0.0.1:{port}"
+    cmd = [sys.executable, "-m", "uvicorn", "app:app", "--host", "127.0.0.1",
+           "--port", str(port), "--log-level", "warning"]
+    started = time.perf_counter()
+    proc = subprocess.Popen(cmd, cwd=REPO_DIR, env={**os.environ, **env},
+                            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        with httpx.Client(base_url=base_url, timeout=30.0) as http:
+            while True:
+                try:
+                    if http.get("/api/test").status_code == 200:
+                        break
+                except httpx.TransportError:
+                    pass
+                if time.perf_counter() - started > 60:
+                    raise RuntimeError("server did not come up in 60s")
+                time.sleep(0.005)
+            first_ping = time.perf_counter() - started
+
+            http.post("/api/auth/signup", json={"username": f"cold-{uuid.uuid4().hex[:8]}",
+                                                "password": "cold"}).raise_for_status()
+            first_db = time.perf_counter() - started
+
+            http.post("/api/chat", json=CHAT_BODY).raise_for_status()
+            first_ai = time.perf_counter() - started
+    finally:
+        proc.terminate()
+        try:
+            proc.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            proc.kill()
+    return {"first_ping": first_ping, "first_db": first_db, "first_ai": first_ai}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--latency-ms", type=int, default=50, help="fake OpenRouter latency")
+    parser.add_argument("--env", action="append", default=[], metavar="KEY=VALUE",
+                        help="extra environment for the app (repeatable)")
+    args = parser.parse_args()
+
+    extra = dict(item.split("=", 1) for item in args.env)
+    results = {"import": [], "first_ping": [], "first_db": [], "first_ai": []}
+
+    with run_fake_openrouter(latency_ms=args.latency_ms, jitter_ms=0, tokens_per_second=100000) as fake_url:
+        for run in range(args.runs):
+            with tempfile.TemporaryDirectory() as tmp:
+                env = {
+                    "DATABASE_URL": f"sqlite:///{os.path.join(tmp, 'cold.db')}",
+                    "OPENROUTER_API_KEY": "bench-key",
+                    "OPENROUTER_BASE_URL": fake_url,
+                    "TRIVIA_POOL_LANGUAGES": "",
+                    **extra,
+                }
+                results["import"].append(time_import(env))
+                for name, value in boot_once(env).items():
+                    results[name].append(value)
+            print(f"  run {run + 1}/{args.runs} done")
+
+    print(f"\n{'stage':<12}{'median ms':>12}{'min ms':>10}{'max ms':>10}")
+    for name, values in results.items():
+        print(f"{name:<12}{statistics.median(values) * 1000:>12.0f}"
+              f"{min(values) * 1000:>10.0f}{max(values) * 1000:>10.0f}")
+
+
+if __name__ == "__main__":
+    main()
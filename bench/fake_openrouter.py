@@ -0,0 +1,195 @@
+# bench/fake_openrouter.py - Local stand-in for the OpenRouter chat API
+#
+# Serves an OpenAI-compatible POST /chat/completions (plain and streamed)
+# with configurable latency, jitter, error rate, stalls and malformed JSON, so the app can be load
+# tested without spending tokens:
+#
+#   python bench/fake_openrouter.py --port 9100 --latency-ms 800 --jitter-ms 300
+#   OPENROUTER_API_KEY=fake OPENROUTER_BASE_URL=http://127.0.0.1:9100 uvicorn app:app
+import argparse
+import asyncio
+import json
+import random
+import time
+import uuid
+
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+LESSON_MARKDOWN = """# 🎯 Benchmark Topic: Comprehensive Guide
+
+## 📖 Introduction
+This is a synthetic lesson produced by the local OpenRouter stand-in.
+
+## 🎓 Key Concepts
+### 🔍 Main Idea 1
+- **Explanation**: Fundamentals explained at length for benchmarking purposes.
+- **Example**: A practical example with enough words to look like a real lesson.
+- **💡 Pro Tip**: Measure before you optimize.
+
+## 🚀 Next Steps
+Keep learning!
+""" * 4
+
+QUIZ = [
+    {"q": f"Synthetic question {i + 1}?",
+     "options": ["Option A", "Option B", "Option C", "Option D"],
+     "answer": "Option A"}
+    for i in range(5)
+]
+
+JSON_PAYLOAD = json.dumps({"lesson": "A short synthetic lesson. " * 20, "quiz": QUIZ})
+
+
+class Settings:
+    latency_ms = 500.0
+    jitter_ms = 200.0
+    error_rate = 0.0
+    stall_rate = 0.0  # share of requests that hang for stall_ms
+    stall_ms = 60000.0
+    model_latency_ms = {}  # per-model override of latency_ms
+    malformed_rate = 0.0  # share of JSON-mode replies damaged like real model output
+    tokens_per_second = 200.0
+    chunk_chars = 16
+
+
+settings = Settings()
+app = FastAPI()
+stats = {"requests": 0, "streams": 0, "errors": 0, "stalls": 0, "malformed": 0}
+
+
+def _delay(model=None):
+    if random.random() < settings.stall_rate:
+        stats["stalls"] += 1
+        return settings.stall_ms / 1000
+    jitter = random.uniform(-settings.jitter_ms, settings.jitter_ms)
+    return max(0.0, settings.model_latency_ms.get(model, settings.latency_ms) + jitter) / 1000
+
+
+def _malformed(payload):
+    """Fenced and commented with a trailing comma, or cut off mid-quiz"""
+    stats["malformed"] += 1
+    if random.random() < 0.5:
+        text = json.dumps(payload, indent=2).replace("\n  ]", ",\n    // 4 more questions\n  ]")
+        return f"```json\n{text}\n```"
+    text = json.dumps(payload)
+    return text[:text.index('"q": "Synthetic question 2?"') + 40]
+
+
+def _content(body):
+    if (body.get("response_format") or {}).get("type") == "json_object":
+        if random.random() < settings.malformed_rate:
+            return _malformed(json.loads(JSON_PAYLOAD))
+        return JSON_PAYLOAD
+    return LESSON_MARKDOWN
+
+
+def _usage(body, content):
+    prompt_chars = sum(len(str(m.get("content", ""))) for m in body.get("messages", []))
+    prompt_tokens = prompt_chars // 4
+    completion_tokens = len(content) // 4
+    return {
+        "prompt_tokens": prompt_tokens,
+        "completion_tokens": completion_tokens,
+        "total_tokens": prompt_tokens + completion_tokens,
+    }
+
+
+def _chunk(completion_id, model, delta, finish_reason=None):
+    return {
+        "id": completion_id,
+        "object": "chat.completion.chunk",
+        "created": int(time.time()),
+        "model": model,
+        "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}],
+    }
+
+
+@app.post("/chat/completions")
+async def chat_completions(request: Request):
+    body = await request.json()
+    stats["requests"] += 1
+    model = body.get("model", "fake-model")
+    completion_id = f"chatcmpl-{uuid.uuid4().hex[:12]}"
+
+    if random.random() < settings.error_rate:
+        stats["errors"] += 1
+        await asyncio.sleep(_delay() / 2)
+        return JSONResponse({"error": {"message": "injected upstream error", "code": 502}}, status_code=502)
+
+    content = _content(body)
+
+    if body.get("stream"):
+        stats["streams"] += 1
+
+        async def events():
+            # Time to first token, then a steady token rate
+            await asyncio.sleep(_delay(model) / 4)
+            yield f"data: {json.dumps(_chunk(completion_id, model, {'role': 'assistant'}))}\n\n"
+            step = settings.chunk_chars
+            pause = (step / 4) / settings.tokens_per_second
+            for start in range(0, len(content), step):
+                await asyncio.sleep(pause)
+                delta = {"content": content[start:start + step]}
+                yield f"data: {json.dumps(_chunk(completion_id, model, delta))}\n\n"
+            yield f"data: {json.dumps(_chunk(completion_id, model, {}, 'stop'))}\n\n"
+            yield "data: [DONE]\n\n"
+
+        return StreamingResponse(events(), media_type="text/event-stream")
+
+    await asyncio.sleep(_delay(model))
+    return {
+        "id": completion_id,
+        "object": "chat.completion",
+        "created": int(time.time()),
+        "model": model,
+        "choices": [{
+            "index": 0,
+            "message": {"role": "assistant", "content": content},
+            "finish_reason": "stop",
+        }],
+        "usage": _usage(body, content),
+    }
+
+
+@app.get("/models")
+async def models():
+    return {"data": [{"id": "meta-llama/llama-3.1-8b-instruct"}]}
+
+
+@app.get("/stats")
+async def get_stats():
+    return stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=9100)
+    parser.add_argument("--latency-ms", type=float, default=settings.latency_ms)
+    parser.add_argument("--jitter-ms", type=float, default=settings.jitter_ms)
+    parser.add_argument("--error-rate", type=float, default=settings.error_rate)
+    parser.add_argument("--stall-rate", type=float, default=settings.stall_rate)
+    parser.add_argument("--stall-ms", type=float, default=settings.stall_ms)
+    parser.add_argument("--malformed-rate", type=float, default=settings.malformed_rate)
+    parser.add_argument("--model-latency-ms", default="",
+                        help="per-model latency, e.g. 'big-model=2000,small-model=300'")
+    parser.add_argument("--tokens-per-second", type=float, default=settings.tokens_per_second)
+    args = parser.parse_args()
+
+    settings.latency_ms = args.latency_ms
+    settings.jitter_ms = args.jitter_ms
+    settings.error_rate = args.error_rate
+    settings.stall_rate = args.stall_rate
+    settings.stall_ms = args.stall_ms
+    settings.malformed_rate = args.malformed_rate
+    settings.tokens_per_second = args.tokens_per_second
+    for part in filter(None, args.model_latency_ms.split(",")):
+        name, _, ms = part.rpartition("=")
+        settings.model_latency_ms[name.strip()] = float(ms)
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,55 @@
+# bench/json_salvage.py - How much malformed model JSON is served vs. thrown away
+#
+# Boots the local OpenRouter stand-in so that a share of JSON-mode replies
+# come back fenced / commented / with trailing commas or cut off mid-quiz,
+# requests assisted lessons (plain and streamed) and trivia, and reports how
+# many were answered with the canned fallback plus the app's repair stats:
+#
+#   python bench/json_salvage.py --lessons 40 --malformed-rate 0.5
+import argparse
+import json
+import os
+import tempfile
+
+import httpx
+
+from _server import run_app, run_fake_openrouter
+
+FALLBACK_MARKER = "This is a fallback lesson"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--lessons", type=int, default=40)
+    parser.add_argument("--malformed-rate", type=float, default=0.5)
+    args = parser.parse_args()
+
+    with run_fake_openrouter(latency_ms=50, jitter_ms=0, tokens_per_second=2000,
+                             malformed_rate=args.malformed_rate) as fake_url, \
+            tempfile.TemporaryDirectory() as tmp:
+        env = {"DATABASE_URL": f"sqlite:///{os.path.join(tmp, 'bench.db')}",
+               "OPENROUTER_API_KEY": "bench-key", "OPENROUTER_BASE_URL": fake_url,
+               "TRIVIA_POOL_LANGUAGES": "English", "PREFETCH_ENABLED": "0"}
+        with run_app(env) as base_url, httpx.Client(base_url=base_url, timeout=60.0) as http:
+            fallbacks = {"assisted": 0, "assisted_stream": 0}
+            quiz_sizes = []
+            for i in range(args.lessons):
+                body = {"topic": f"Topic {i}", "language": "English", "rank": "Beginner", "level": 1}
+                lesson = http.post("/api/lesson/assisted", json=body).json()
+                fallbacks["assisted"] += lesson["lesson"].startswith(FALLBACK_MARKER)
+                quiz_sizes.append(len(lesson["quiz"]))
+
+                body["topic"] = f"Streamed topic {i}"
+                events = [json.loads(line) for line in
+                          http.post("/api/lesson/assisted/stream", json=body).text.splitlines()]
+                fallbacks["assisted_stream"] += any(e["event"] == "fallback" for e in events)
+
+            stats = http.get("/api/cache/stats").json()["json_repair"]
+
+    print(f"malformed rate {args.malformed_rate:.0%}, {args.lessons} lessons per route")
+    print(f"fallback lessons: {fallbacks}  quiz sizes: min {min(quiz_sizes)} max {max(quiz_sizes)}")
+    print("repair outcomes:", json.dumps(stats))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,262 @@
+# bench/load_test.py - Mixed-workload load test against a local OpenRouter stand-in
+#
+# Boots bench/fake_openrouter.py and the app (uvicorn), then drives a weighted
+# mix of auth, dashboard polling, XP bursts and lesson/chat/trivia calls at a
+# fixed concurrency. Reports p50/p95/p99 latency and throughput per route and
+# writes them as JSON so runs can be compared across commits:
+#
+#   python bench/load_test.py --duration 30 --concurrency 100 --output before.json
+#   python bench/load_test.py --duration 30 --concurrency 100 --compare before.json
+import argparse
+import asyncio
+import json
+import os
+import random
+import subprocess
+import tempfile
+import time
+import uuid
+from collections import defaultdict
+
+import httpx
+
+from _server import REPO_DIR, run_app, run_fake_openrouter
+
+DEFAULT_MIX = "auth=1,dashboard=20,xp=4,assisted=2,self=2,chat=2,trivia=2"
+LESSON_BODY = {"language": "English", "rank": "Beginner", "level": 1}
+
+
+def percentile(ordered, pct):
+    if not ordered:
+        return 0.0
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def parse_mix(text):
+    mix = {}
+    for part in text.split(","):
+        name, _, weight = part.partition("=")
+        mix[name.strip()] = float(weight or 1)
+    unknown = set(mix) - set(SCENARIOS)
+    if unknown:
+        raise SystemExit(f"unknown scenario(s): {', '.join(sorted(unknown))}")
+    return mix
+
+
+class Recorder:
+    def __init__(self):
+        self.latencies = defaultdict(list)
+        self.errors = defaultdict(int)
+
+    async def call(self, http, route, method, path, **kwargs):
+        started = time.perf_counter()
+        try:
+            r = await http.request(method, path, **kwargs)
+            ok = r.status_code < 400
+        except httpx.HTTPError:
+            r, ok = None, False
+        self.latencies[route].append(time.perf_counter() - started)
+        if not ok:
+            self.errors[route] += 1
+        return r
+
+
+# ----------------------------------------------------------------------------
+# Scenarios
+# ----------------------------------------------------------------------------
+async def scenario_auth(http, rec, ctx):
+    credentials = {"username": f"load-{uuid.uuid4().hex[:10]}", "password": "load-test"}
+    await rec.call(http, "auth/signup", "POST", "/api/auth/signup", json=credentials)
+    await rec.call(http, "auth/signin", "POST", "/api/auth/signin", json=credentials)
+
+
+async def scenario_dashboard(http, rec, ctx):
+    user = random.choice(ctx["users"])
+    await rec.call(http, "user/dashboard", "POST", "/api/user/dashboard", json={},
+                   headers=user["headers"])
+
+
+async def scenario_xp(http, rec, ctx):
+    user = random.choice(ctx["users"])
+    body = {"topic": f"topic-{random.randrange(ctx['topics'])}", "score": 10, "level": 1}
+    await rec.call(http, "user/xp", "POST", "/api/user/xp", json=body, headers=user["headers"])
+
+
+async def scenario_assisted(http, rec, ctx):
+    body = {**LESSON_BODY, "topic": f"Topic {random.randrange(ctx['topics'])}"}
+    await rec.call(http, "lesson/assisted", "POST", "/api/lesson/assisted", json=body)
+
+
+async def scenario_self(http, rec, ctx):
+    body = {**LESSON_BODY, "topic": f"Topic {random.randrange(ctx['topics'])}"}
+    await rec.call(http, "lesson/self", "POST", "/api/lesson/self", json=body)
+
+
+async def scenario_chat(http, rec, ctx):
+    body = {
+        "lessonContent": "A short lesson about fractions. " * 20,
+        "messages": [{"author": "user", "content": f"Question {random.randrange(1000)}?"}],
+        "language": "English",
+    }
+    await rec.call(http, "chat", "POST", "/api/chat", json=body)
+
+
+async def scenario_trivia(http, rec, ctx):
+    await rec.call(http, "trivia", "POST", "/api/trivia", json={"language": "English"})
+
+
+SCENARIOS = {
+    "auth": scenario_auth,
+    "dashboard": scenario_dashboard,
+    "xp": scenario_xp,
+    "assisted": scenario_assisted,
+    "self": scenario_self,
+    "chat": scenario_chat,
+    "trivia": scenario_trivia,
+}
+
+
+# ----------------------------------------------------------------------------
+# Driver
+# ----------------------------------------------------------------------------
+async def create_users(http, count):
+    users = []
+    for _ in range(count):
+        credentials = {"username": f"load-{uuid.uuid4().hex[:10]}", "password": "load-test"}
+        r = await http.post("/api/auth/signup", json=credentials)
+        r.raise_for_status()
+        token = r.json().get("token")
+        headers = {"Authorization": f"Bearer {token}"} if token else {}
+        users.append({"username": credentials["username"], "headers": headers})
+    return users
+
+
+async def drive(base_url, args, mix):
+    limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=args.timeout) as http:
+        ctx = {"users": await create_users(http, args.users), "topics": args.topics}
+        names, weights = list(mix), list(mix.values())
+
+        async def worker(rec, deadline):
+            while time.perf_counter() < deadline:
+                scenario = SCENARIOS[random.choices(names, weights)[0]]
+                await scenario(http, rec, ctx)
+
+        if args.warmup > 0:
+            deadline = time.perf_counter() + args.warmup
+            await asyncio.gather(*(worker(Recorder(), deadline) for _ in range(args.concurrency)))
+
+        rec = Recorder()
+        started = time.perf_counter()
+        deadline = started + args.duration
+        await asyncio.gather(*(worker(rec, deadline) for _ in range(args.concurrency)))
+        elapsed = time.perf_counter() - started
+    return rec, elapsed
+
+
+def summarize(rec, elapsed):
+    routes = {}
+    all_latencies = []
+    for route, samples in sorted(rec.latencies.items()):
+        ordered = sorted(samples)
+        all_latencies.extend(samples)
+        routes[route] = {
+            "count": len(ordered),
+            "errors": rec.errors[route],
+            "throughput_rps": round(len(ordered) / elapsed, 2),
+            "mean_ms": round(sum(ordered) / len(ordered) * 1000, 2),
+            "p50_ms": round(percentile(ordered, 50) * 1000, 2),
+            "p95_ms": round(percentile(ordered, 95) * 1000, 2),
+            "p99_ms": round(percentile(ordered, 99) * 1000, 2),
+            "max_ms": round(ordered[-1] * 1000, 2),
+        }
+    ordered = sorted(all_latencies)
+    total = {
+        "count": len(ordered),
+        "errors": sum(rec.errors.values()),
+        "throughput_rps": round(len(ordered) / elapsed, 2),
+        "p50_ms": round(percentile(ordered, 50) * 1000, 2),
+        "p95_ms": round(percentile(ordered, 95) * 1000, 2),
+        "p99_ms": round(percentile(ordered, 99) * 1000, 2),
+    }
+    return routes, total
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], cwd=REPO_DIR, text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def print_report(routes, total, previous=None):
+    header = f"{'route':<18} {'count':>7} {'err':>5} {'rps':>8} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}"
+    if previous:
+        header += f" {'Δp95':>8}"
+    print(header)
+    for route, row in list(routes.items()) + [("TOTAL", total)]:
+        line = (f"{route:<18} {row['count']:>7} {row['errors']:>5} {row['throughput_rps']:>8.1f} "
+                f"{row['p50_ms']:>9.1f} {row['p95_ms']:>9.1f} {row['p99_ms']:>9.1f}")
+        if previous:
+            before = previous["total"] if route == "TOTAL" else previous["routes"].get(route)
+            if before and before["p95_ms"]:
+                line += f" {(row['p95_ms'] / before['p95_ms'] - 1) * 100:>+7.0f}%"
+        print(line)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--duration", type=float, default=20.0, help="measured seconds")
+    parser.add_argument("--warmup", type=float, default=3.0, help="unmeasured seconds first")
+    parser.add_argument("--concurrency", type=int, default=50, help="simultaneous virtual clients")
+    parser.add_argument("--mix", default=DEFAULT_MIX, help="weighted scenarios, e.g. 'dashboard=10,chat=1'")
+    parser.add_argument("--users", type=int, default=20, help="pre-created users for dashboard/xp")
+    parser.add_argument("--topics", type=int, default=50, help="distinct lesson/XP topics")
+    parser.add_argument("--workers", type=int, default=1, help="uvicorn worker processes")
+    parser.add_argument("--timeout", type=float, default=120.0)
+    parser.add_argument("--llm-latency-ms", type=float, default=800.0)
+    parser.add_argument("--llm-jitter-ms", type=float, default=300.0)
+    parser.add_argument("--llm-error-rate", type=float, default=0.0)
+    parser.add_argument("--llm-tokens-per-second", type=float, default=200.0)
+    parser.add_argument("--output", default="load_test_results.json")
+    parser.add_argument("--compare", help="previous results file to diff p95 against")
+    args = parser.parse_args()
+    mix = parse_mix(args.mix)
+
+    fake = run_fake_openrouter(
+        latency_ms=args.llm_latency_ms, jitter_ms=args.llm_jitter_ms,
+        error_rate=args.llm_error_rate, tokens_per_second=args.llm_tokens_per_second,
+    )
+    with tempfile.TemporaryDirectory() as tmp, fake as fake_url:
+        env = {
+            "OPENROUTER_API_KEY": "fake-key",
+            "OPENROUTER_BASE_URL": fake_url,
+            "DATABASE_URL": os.environ.get("DATABASE_URL", f"sqlite:///{os.path.join(tmp, 'load.db')}"),
+        }
+        with run_app(env=env, workers=args.workers) as base_url:
+            rec, elapsed = asyncio.run(drive(base_url, args, mix))
+
+    routes, total = summarize(rec, elapsed)
+    result = {
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "git_commit": git_commit(),
+        "config": {key: value for key, value in vars(args).items() if key not in ("output", "compare")},
+        "elapsed_s": round(elapsed, 2),
+        "routes": routes,
+        "total": total,
+    }
+
+    previous = None
+    if args.compare:
+        with open(args.compare) as f:
+            previous = json.load(f)
+    print_report(routes, total, previous)
+
+    with open(args.output, "w") as f:
+        json.dump(result, f, indent=2)
+    print(f"📝 Results written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,116 @@
+# bench/serialization.py - JSON encoding cost and bytes on the wire
+#
+# Part 1 (in-process): per-call cost of FastAPI's default path
+# (jsonable_encoder + stdlib json) against orjson, for representative
+# self-lesson, assisted-lesson, chat and dashboard payloads, plus their
+# size raw / gzip / brotli.
+#
+# Part 2 (--live): boots the app against the local OpenRouter stand-in and
+# reports wire bytes per route for each Accept-Encoding.
+#
+#   python bench/serialization.py
+#   python bench/serialization.py --live
+import argparse
+import gzip
+import json
+import os
+import tempfile
+import timeit
+
+import httpx
+from fastapi.encoders import jsonable_encoder
+
+from _server import run_app, run_fake_openrouter
+from fake_openrouter import JSON_PAYLOAD, LESSON_MARKDOWN
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+PROFILE = {
+    "id": 42, "username": "student42", "avatar": "https://api.multiavatar.com/student42.svg",
+    "total_xp": 1234, "level": 13, "rank": "Epic", "topics_completed": 27,
+    "completed_topics_in_rank": [f"Topic {i}" for i in range(7)],
+    "school": "LearnSphere Academy", "description": "Loves space and maths", "version": 57,
+}
+
+PAYLOADS = {
+    "self_lesson": {"lesson": LESSON_MARKDOWN},
+    "assisted_lesson": json.loads(JSON_PAYLOAD),
+    "chat": {"reply": LESSON_MARKDOWN[:600]},
+    "dashboard": {"user": PROFILE},
+}
+
+
+def stdlib_path(payload):
+    # What JSONResponse does after FastAPI's jsonable_encoder pass
+    return json.dumps(jsonable_encoder(payload), ensure_ascii=False, allow_nan=False,
+                      indent=None, separators=(",", ":")).encode("utf-8")
+
+
+def orjson_path(payload):
+    return orjson.dumps(payload, option=orjson.OPT_NON_STR_KEYS)
+
+
+def per_call_us(fn, payload, number=20000):
+    return min(timeit.repeat(lambda: fn(payload), number=number, repeat=3)) / number * 1e6
+
+
+def in_process():
+    print(f"{'payload':<16}{'stdlib us':>10}{'orjson us':>10}{'raw B':>8}{'gzip B':>8}{'br B':>8}")
+    for name, payload in PAYLOADS.items():
+        body = stdlib_path(payload)
+        stdlib_us = per_call_us(stdlib_path, payload)
+        orjson_us = per_call_us(orjson_path, payload) if orjson else float("nan")
+        br = len(brotli.compress(body, quality=5)) if brotli else "-"
+        print(f"{name:<16}{stdlib_us:>10.1f}{orjson_us:>10.1f}{len(body):>8}"
+              f"{len(gzip.compress(body, 6)):>8}{br:>8}")
+
+
+def live():
+    lesson = {"topic": "Photosynthesis", "language": "English", "rank": "Beginner", "level": 1}
+    chat = {"lessonContent": "Photosynthesis", "language": "English",
+            "messages": [{"author": "user", "content": "Explain it again"}]}
+    encodings = ["identity", "gzip"] + (["br"] if brotli else [])
+
+    with run_fake_openrouter(latency_ms=10, jitter_ms=0) as fake_url, tempfile.TemporaryDirectory() as tmp:
+        env = {"DATABASE_URL": f"sqlite:///{os.path.join(tmp, 'bench.db')}",
+               "OPENROUTER_API_KEY": "bench-key", "OPENROUTER_BASE_URL": fake_url,
+               "TRIVIA_POOL_LANGUAGES": ""}
+        with run_app(env) as base_url, httpx.Client(base_url=base_url, timeout=30.0) as http:
+            token = http.post("/api/auth/signup", json={"username": "bench", "password": "bench"}).json()["token"]
+            calls = {
+                "self_lesson": ("/api/lesson/self", lesson, {}),
+                "assisted_lesson": ("/api/lesson/assisted", lesson, {}),
+                "chat": ("/api/chat", chat, {}),
+                "dashboard": ("/api/user/dashboard", {}, {"Authorization": f"Bearer {token}"}),
+            }
+            print(f"\n{'route':<16}" + "".join(f"{e + ' B':>12}" for e in encodings))
+            for name, (path, body, headers) in calls.items():
+                sizes = []
+                for encoding in encodings:
+                    with http.stream("POST", path, json=body,
+                                     headers={**headers, "Accept-Encoding": encoding}) as r:
+                        r.read()
+                        sizes.append(r.num_bytes_downloaded)
+                print(f"{name:<16}" + "".join(f"{size:>12}" for size in sizes))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--live", action="store_true", help="also measure wire bytes against a running app")
+    args = parser.parse_args()
+
+    in_process()
+    if args.live:
+        live()
+
+
+if __name__ == "__main__":
+    main()
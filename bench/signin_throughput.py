@@ -0,0 +1,94 @@
+# bench/signin_throughput.py - Signin throughput at each scrypt cost setting
+#
+# Boots the app once per PASSWORD_SCRYPT_LOG_N value, hammers /api/auth/signin
+# and, at the same time, probes /api/test to show whether hashing stalls the
+# event loop.
+#
+#   python bench/signin_throughput.py --costs 12 14 15 --signins 200
+import argparse
+import asyncio
+import statistics
+import tempfile
+import os
+import time
+import uuid
+
+import httpx
+
+from _server import run_app
+
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+async def measure(base_url, signins, concurrency):
+    username = f"bench-{uuid.uuid4().hex[:8]}"
+    credentials = {"username": username, "password": "correct horse battery staple"}
+    limits = httpx.Limits(max_connections=concurrency + 1)
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=120.0) as http:
+        (await http.post("/api/auth/signup", json=credentials)).raise_for_status()
+
+        semaphore = asyncio.Semaphore(concurrency)
+        signin_latencies = []
+        probe_latencies = []
+        done = asyncio.Event()
+
+        async def signin():
+            async with semaphore:
+                started = time.perf_counter()
+                r = await http.post("/api/auth/signin", json=credentials)
+                r.raise_for_status()
+                signin_latencies.append(time.perf_counter() - started)
+
+        async def probe():
+            while not done.is_set():
+                started = time.perf_counter()
+                await http.get("/api/test")
+                probe_latencies.append(time.perf_counter() - started)
+                await asyncio.sleep(0.01)
+
+        prober = asyncio.create_task(probe())
+        started = time.perf_counter()
+        await asyncio.gather(*(signin() for _ in range(signins)))
+        elapsed = time.perf_counter() - started
+        done.set()
+        await prober
+
+    return {
+        "signins_per_s": signins / elapsed,
+        "signin_p50_ms": statistics.median(signin_latencies) * 1000,
+        "signin_p95_ms": percentile(signin_latencies, 95) * 1000,
+        "probe_p95_ms": percentile(probe_latencies, 95) * 1000,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--costs", type=int, nargs="+", default=[12, 14, 15],
+                        help="PASSWORD_SCRYPT_LOG_N values to benchmark")
+    parser.add_argument("--signins", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--hash-workers", type=int, default=None)
+    args = parser.parse_args()
+
+    print(f"{'log2(N)':>8} {'signin/s':>10} {'p50 ms':>9} {'p95 ms':>9} {'/api/test p95 ms':>17}")
+    for cost in args.costs:
+        with tempfile.TemporaryDirectory() as tmp:
+            env = {
+                "OPENROUTER_API_KEY": "",
+                "DATABASE_URL": f"sqlite:///{os.path.join(tmp, 'bench.db')}",
+                "PASSWORD_SCRYPT_LOG_N": str(cost),
+            }
+            if args.hash_workers:
+                env["PASSWORD_HASH_WORKERS"] = str(args.hash_workers)
+            with run_app(env=env) as base_url:
+                result = asyncio.run(measure(base_url, args.signins, args.concurrency))
+        print(f"{cost:>8} {result['signins_per_s']:>10.1f} {result['signin_p50_ms']:>9.1f} "
+              f"{result['signin_p95_ms']:>9.1f} {result['probe_p95_ms']:>17.1f}")
+
+
+if __name__ == "__main__":
+    main()
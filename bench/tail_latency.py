@@ -0,0 +1,80 @@
+# bench/tail_latency.py - Chat latency when upstream sometimes stalls or fails
+#
+# Boots the local OpenRouter stand-in with a share of requests that hang
+# (--stall-rate) or fail (--error-rate) and sends chat turns at a fixed
+# concurrency, once per hedging setting. Reports p50/p95/p99/max, fallback
+# replies and the breaker / hedge counters from /api/cache/stats:
+#
+#   python bench/tail_latency.py --requests 300 --stall-rate 0.05
+#   python bench/tail_latency.py --error-rate 0.8      # watch the breaker open
+import argparse
+import asyncio
+import os
+import tempfile
+import time
+
+import httpx
+
+from _server import run_app, run_fake_openrouter
+
+FALLBACK_PREFIX = "I'm having trouble"
+
+
+def percentile(ordered, pct):
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+
+async def drive(base_url, requests, concurrency):
+    latencies, fallbacks = [], 0
+    limit = asyncio.Semaphore(concurrency)
+
+    async with httpx.AsyncClient(base_url=base_url, timeout=120.0) as http:
+        async def one(i):
+            nonlocal fallbacks
+            body = {"lessonContent": "Photosynthesis", "language": "English",
+                    "messages": [{"author": "user", "content": f"Question {i}"}]}
+            async with limit:
+                started = time.perf_counter()
+                reply = (await http.post("/api/chat", json=body)).json().get("reply", "")
+                latencies.append(time.perf_counter() - started)
+                fallbacks += reply.startswith(FALLBACK_PREFIX)
+
+        await asyncio.gather(*(one(i) for i in range(requests)))
+        upstream = (await http.get("/api/cache/stats")).json()["upstream"]
+    return sorted(latencies), fallbacks, upstream
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--requests", type=int, default=300)
+    parser.add_argument("--concurrency", type=int, default=10)
+    parser.add_argument("--latency-ms", type=float, default=300)
+    parser.add_argument("--jitter-ms", type=float, default=100)
+    parser.add_argument("--stall-rate", type=float, default=0.05)
+    parser.add_argument("--stall-ms", type=float, default=60000)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--deadline", type=float, default=5.0, help="LLM_DEADLINE_CHAT for the run")
+    args = parser.parse_args()
+
+    print(f"{'hedge':<7}{'p50 s':>8}{'p95 s':>8}{'p99 s':>8}{'max s':>8}{'fallback':>10}"
+          f"{'hedged':>8}{'breaker':>10}")
+    with run_fake_openrouter(latency_ms=args.latency_ms, jitter_ms=args.jitter_ms,
+                             error_rate=args.error_rate, stall_rate=args.stall_rate,
+                             stall_ms=args.stall_ms) as fake_url:
+        for hedge in ("0", "1"):
+            with tempfile.TemporaryDirectory() as tmp:
+                env = {"DATABASE_URL": f"sqlite:///{os.path.join(tmp, 'bench.db')}",
+                       "OPENROUTER_API_KEY": "bench-key", "OPENROUTER_BASE_URL": fake_url,
+                       "TRIVIA_POOL_LANGUAGES": "", "PREFETCH_ENABLED": "0",
+                       "LLM_HEDGE": hedge, "LLM_DEADLINE_CHAT": str(args.deadline)}
+                with run_app(env) as base_url:
+                    latencies, fallbacks, upstream = asyncio.run(
+                        drive(base_url, args.requests, args.concurrency))
+            chat = upstream["endpoints"].get("chat", {})
+            print(f"{hedge:<7}{percentile(latencies, 50):>8.2f}{percentile(latencies, 95):>8.2f}"
+                  f"{percentile(latencies, 99):>8.2f}{latencies[-1]:>8.2f}{fallbacks:>10}"
+                  f"{chat.get('hedges', 0):>8}{upstream['breaker']['opened']:>9}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,109 @@
+# bench/xp_stress.py - Concurrency stress test for /api/user/xp and /api/bonus
+#
+# Fires many concurrent XP and bonus awards at one user and checks that no
+# update was lost and that every rank promotion fired exactly once.
+#
+#   python bench/xp_stress.py --awards 300 --concurrency 64
+#   DATABASE_URL=postgresql://... python bench/xp_stress.py --workers 4
+import argparse
+import asyncio
+import os
+import random
+import sys
+import tempfile
+import time
+import uuid
+
+import httpx
+
+from _server import run_app
+
+RANKS = ["Beginner", "Rare", "Epic", "Mythic", "Legendary"]
+XP_SCORE = 3
+BONUS_SCORE = 2
+
+
+def expected_progress(distinct_topics):
+    rank_index = min(distinct_topics // 10, len(RANKS) - 1)
+    topics_in_rank = distinct_topics - 10 * rank_index
+    return RANKS[rank_index], topics_in_rank
+
+
+async def run(base_url, args):
+    username = f"stress-{uuid.uuid4().hex[:8]}"
+    limits = httpx.Limits(max_connections=args.concurrency)
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=60.0) as http:
+        r = await http.post("/api/auth/signup", json={"username": username, "password": "stress"})
+        r.raise_for_status()
+
+        # Each topic is awarded exactly once so the final rank is deterministic;
+        # the remaining requests are bonuses hitting the same row.
+        calls = [("xp", f"topic-{i}") for i in range(args.topics)]
+        calls += [("bonus", None)] * (args.awards - args.topics)
+        random.shuffle(calls)
+
+        semaphore = asyncio.Semaphore(args.concurrency)
+        failures = []
+
+        async def award(kind, topic):
+            async with semaphore:
+                if kind == "xp":
+                    body = {"username": username, "topic": topic, "score": XP_SCORE, "level": 1}
+                    r = await http.post("/api/user/xp", json=body)
+                else:
+                    r = await http.post("/api/bonus", json={"username": username, "score": BONUS_SCORE})
+                if r.status_code != 200:
+                    failures.append((kind, r.status_code, r.text[:200]))
+
+        started = time.perf_counter()
+        await asyncio.gather(*(award(kind, topic) for kind, topic in calls))
+        elapsed = time.perf_counter() - started
+
+        r = await http.post("/api/user/dashboard", json={"username": username})
+        r.raise_for_status()
+        user = r.json()["user"]
+
+    bonuses = args.awards - args.topics
+    want_xp = args.topics * XP_SCORE + bonuses * BONUS_SCORE
+    want_rank, want_topics = expected_progress(args.topics)
+
+    print(f"⏱️  {args.awards} awards in {elapsed:.2f}s ({args.awards / elapsed:.0f} req/s)")
+    problems = [f"{kind} -> HTTP {status}: {body}" for kind, status, body in failures[:5]]
+    if user["total_xp"] != want_xp:
+        problems.append(f"total_xp {user['total_xp']} != expected {want_xp} (lost updates)")
+    if user["rank"] != want_rank:
+        problems.append(f"rank {user['rank']} != expected {want_rank}")
+    if user["topics_completed"] != want_topics or len(user["completed_topics_in_rank"]) != want_topics:
+        problems.append(
+            f"topics_completed {user['topics_completed']} / "
+            f"{len(user['completed_topics_in_rank'])} listed != expected {want_topics}"
+        )
+    return failures, problems
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--awards", type=int, default=300)
+    parser.add_argument("--topics", type=int, default=25, help="distinct topics among the awards")
+    parser.add_argument("--concurrency", type=int, default=64)
+    parser.add_argument("--workers", type=int, default=1, help="uvicorn worker processes")
+    args = parser.parse_args()
+    args.topics = min(args.topics, args.awards)
+
+    env = {"OPENROUTER_API_KEY": ""}
+    with tempfile.TemporaryDirectory() as tmp:
+        if "DATABASE_URL" not in os.environ:
+            env["DATABASE_URL"] = f"sqlite:///{os.path.join(tmp, 'stress.db')}"
+        with run_app(env=env, workers=args.workers) as base_url:
+            failures, problems = asyncio.run(run(base_url, args))
+
+    if problems:
+        print(f"❌ {len(failures)} failed request(s)")
+        for problem in problems:
+            print(f"   {problem}")
+        sys.exit(1)
+    print("✅ No lost updates; promotions fired exactly once")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,126 @@
+# cache.py - In-process LRU caches with per-entry TTL
+import os
+import threading
+import time
+from collections import OrderedDict
+
+LESSON_CACHE_SIZE = int(os.environ.get("LESSON_CACHE_SIZE", "512"))
+LESSON_CACHE_TTL = float(os.environ.get("LESSON_CACHE_TTL", "3600"))
+USER_CACHE_SIZE = int(os.environ.get("USER_CACHE_SIZE", "10000"))
+USER_CACHE_TTL = float(os.environ.get("USER_CACHE_TTL", "300"))
+# Set to 1 when running several workers (see user_cache below)
+USER_CACHE_VERIFY = os.environ.get("USER_CACHE_VERIFY", "0") == "1"
+FALLBACK_CACHE_SIZE = int(os.environ.get("FALLBACK_CACHE_SIZE", "256"))
+FALLBACK_CACHE_TTL = float(os.environ.get("FALLBACK_CACHE_TTL", "86400"))
+
+
+class TTLCache:
+    """Size-bounded LRU cache whose entries also expire after `ttl` seconds"""
+
+    def __init__(self, maxsize, ttl, name="cache"):
+        self.name = name
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._invalidations = 0
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                self.misses += 1
+                return default
+
+            expires_at, value = entry
+            if expires_at < time.monotonic():
+                del self._data[key]
+                self.misses += 1
+                return default
+
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def peek(self, key, default=None):
+        """Like get() but leaves hit/miss counters and LRU order alone"""
+        entry = self._data.get(key)
+        if entry is None or entry[0] < time.monotonic():
+            return default
+        return entry[1]
+
+    def __contains__(self, key):
+        """Live entry check that leaves hit/miss counters and LRU order alone"""
+        entry = self._data.get(key)
+        return entry is not None and entry[0] >= time.monotonic()
+
+    def snapshot(self):
+        """Token for set(); taken before reading the value from its source"""
+        return self._invalidations
+
+    def set(self, key, value, snapshot=None):
+        """Store value; skipped if anything was invalidated since `snapshot`,
+        so a slow read-through cannot re-insert data older than a write"""
+        if self.maxsize <= 0:
+            return
+        with self._lock:
+            if snapshot is not None and snapshot != self._invalidations:
+                return
+            self._data[key] = (time.monotonic() + self.ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def pop(self, key):
+        with self._lock:
+            self._invalidations += 1
+            entry = self._data.pop(key, None)
+        return entry[1] if entry else None
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "name": self.name,
+            "size": len(self._data),
+            "maxsize": self.maxsize,
+            "ttl": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+        }
+
+
+def _normalize(value):
+    return " ".join(str(value).split()).casefold()
+
+
+def lesson_key(kind, data):
+    """Cache key for a LessonRequest: (kind, topic, language, rank, level)"""
+    return (
+        kind,
+        _normalize(data.topic),
+        _normalize(data.language),
+        _normalize(data.rank),
+        int(data.level),
+    )
+
+
+lesson_cache = TTLCache(LESSON_CACHE_SIZE, LESSON_CACHE_TTL, name="lessons")
+
+# Serialized user profiles keyed by username; writes update or evict them.
+# The cache is per process, so with several workers a write on one leaves
+# the others' copies stale until USER_CACHE_TTL; with USER_CACHE_VERIFY=1
+# readers check users.version first (one indexed read per cache hit).
+user_cache = TTLCache(USER_CACHE_SIZE, USER_CACHE_TTL, name="users")
+
+# Serialized fallback payloads (CachedJSON) keyed by (kind, topic, language)
+fallback_cache = TTLCache(FALLBACK_CACHE_SIZE, FALLBACK_CACHE_TTL, name="fallbacks")
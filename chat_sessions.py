@@ -0,0 +1,63 @@
+# chat_sessions.py - Server-held chat conversations (lesson context + history)
+import os
+import secrets
+from collections import deque
+
+from cache import TTLCache
+
+CHAT_SESSION_MAX = int(os.environ.get("CHAT_SESSION_MAX", "5000"))
+CHAT_SESSION_TTL = float(os.environ.get("CHAT_SESSION_TTL", "3600"))
+# Upper bound on stored turns; prompts.py decides how many fit a prompt
+CHAT_HISTORY_MESSAGES = int(os.environ.get("CHAT_HISTORY_MESSAGES", "20"))
+CHAT_LESSON_MAX_CHARS = int(os.environ.get("CHAT_LESSON_MAX_CHARS", "20000"))
+
+
+class ChatSession:
+    """Lesson context uploaded once plus a sliding window of recent turns"""
+
+    __slots__ = ("id", "lesson_content", "language", "history")
+
+    def __init__(self, session_id, lesson_content, language, max_history=CHAT_HISTORY_MESSAGES):
+        self.id = session_id
+        self.lesson_content = (lesson_content or "")[:CHAT_LESSON_MAX_CHARS]
+        self.language = language
+        self.history = deque(maxlen=max_history)  # {"role", "content"} dicts
+
+    def add_turn(self, message, reply):
+        self.history.append({"role": "user", "content": message})
+        self.history.append({"role": "assistant", "content": reply})
+
+
+class ChatSessionStore:
+    """
+    Sessions live in this process only, with a sliding TTL. With several
+    workers a client can land on one that never saw its session and gets a
+    404, after which it opens a new one.
+    """
+
+    def __init__(self, maxsize=CHAT_SESSION_MAX, ttl=CHAT_SESSION_TTL):
+        self._sessions = TTLCache(maxsize, ttl, name="chat_sessions")
+
+    @property
+    def ttl(self):
+        return self._sessions.ttl
+
+    def create(self, lesson_content, language):
+        session = ChatSession(secrets.token_urlsafe(16), lesson_content, language)
+        self._sessions.set(session.id, session)
+        return session
+
+    def get(self, session_id):
+        session = self._sessions.get(session_id)
+        if session is not None:
+            self._sessions.set(session_id, session)  # activity extends the TTL
+        return session
+
+    def delete(self, session_id):
+        return self._sessions.pop(session_id) is not None
+
+    def stats(self):
+        return self._sessions.stats()
+
+
+chat_sessions = ChatSessionStore()
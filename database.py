@@ -1,9 +1,14 @@
 # database.py - UPDATED FOR RENDER.COM with SQLAlchemy 1.4
 import os
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker
+import time
+from sqlalchemy import create_engine, event, text
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+from sqlalchemy.orm import Session, sessionmaker
+from sqlalchemy.pool import AsyncAdaptedQueuePool
 from sqlalchemy.ext.declarative import declarative_base  # Changed for SQLAlchemy 1.4
 
+from metrics import instrument_sessions, observe_session
+
 def get_database_url():
     """Get database URL based on environment"""
     
@@ -12,7 +17,12 @@ def get_database_url():
         print("🔧 Using PostgreSQL on Render")
         return os.environ['DATABASE_URL']
     
-    # 2. Check for PythonAnywhere
+    # 2. Explicit SQLite override (benchmarks, tests, custom paths)
+    elif os.environ.get('DATABASE_URL', '').startswith('sqlite'):
+        print("🔧 Using SQLite DB from DATABASE_URL")
+        return os.environ['DATABASE_URL']
+
+    # 3. Check for PythonAnywhere
     elif 'PYTHONANYWHERE_DOMAIN' in os.environ:
         # PythonAnywhere: Use home directory for database
         home_dir = os.path.expanduser('~')
@@ -21,36 +31,116 @@ def get_database_url():
         print(f"🔧 PythonAnywhere DB: {db_url}")
         return db_url
     
-    # 3. Check for Render SQLite (free tier)
+    # 4. Check for Render SQLite (free tier)
     elif 'RENDER' in os.environ:
         print("🔧 Using SQLite on Render (free tier)")
         # Use current directory for database
         return "sqlite:///./learnsphere.db"
     
-    # 4. Local development
+    # 5. Local development
     else:
         print("🔧 Using Local SQLite DB")
         return "sqlite:///./learnsphere.db"
 
+def get_async_database_url(url):
+    """Map a sync database URL onto its async driver (aiosqlite / asyncpg)"""
+    scheme, rest = url.split("://", 1)
+    if scheme.startswith("sqlite"):
+        return f"sqlite+aiosqlite://{rest}"
+    if scheme.startswith("postgres"):
+        return f"postgresql+asyncpg://{rest}"
+    return url
+
 # Get database URL
 DATABASE_URL = get_database_url()
+ASYNC_DATABASE_URL = get_async_database_url(DATABASE_URL)
+
+# ============================================================================
+# ENGINE PROFILE (override via environment)
+# ============================================================================
+# SQLite: applied as PRAGMAs on every new connection
+SQLITE_JOURNAL_MODE = os.environ.get("SQLITE_JOURNAL_MODE", "WAL")
+SQLITE_SYNCHRONOUS = os.environ.get("SQLITE_SYNCHRONOUS", "NORMAL")
+SQLITE_BUSY_TIMEOUT_MS = int(os.environ.get("SQLITE_BUSY_TIMEOUT_MS", "10000"))
+SQLITE_CACHE_SIZE_KB = int(os.environ.get("SQLITE_CACHE_SIZE_KB", "20000"))
+SQLITE_MMAP_SIZE = int(os.environ.get("SQLITE_MMAP_SIZE", str(256 * 1024 * 1024)))
+
+# PostgreSQL: QueuePool sizing and connection health
+DB_POOL_SIZE = int(os.environ.get("DB_POOL_SIZE", "5"))
+DB_MAX_OVERFLOW = int(os.environ.get("DB_MAX_OVERFLOW", "10"))
+DB_POOL_TIMEOUT = float(os.environ.get("DB_POOL_TIMEOUT", "30"))
+DB_POOL_RECYCLE = int(os.environ.get("DB_POOL_RECYCLE", "1800"))
+DB_POOL_PRE_PING = os.environ.get("DB_POOL_PRE_PING", "1") == "1"
+
+
+def set_sqlite_pragmas(dbapi_connection, connection_record):
+    """WAL lets readers run alongside the single writer; busy_timeout makes
+    writers wait for the lock instead of failing with 'database is locked'"""
+    cursor = dbapi_connection.cursor()
+    cursor.execute(f"PRAGMA journal_mode={SQLITE_JOURNAL_MODE}")
+    cursor.execute(f"PRAGMA synchronous={SQLITE_SYNCHRONOUS}")
+    cursor.execute(f"PRAGMA busy_timeout={SQLITE_BUSY_TIMEOUT_MS}")
+    cursor.execute(f"PRAGMA cache_size=-{SQLITE_CACHE_SIZE_KB}")
+    cursor.execute(f"PRAGMA mmap_size={SQLITE_MMAP_SIZE}")
+    cursor.execute("PRAGMA temp_store=MEMORY")
+    cursor.execute("PRAGMA foreign_keys=ON")
+    cursor.close()
+
 
 # Create engine with SQLite compatibility
 if "sqlite" in DATABASE_URL:
     engine = create_engine(
         DATABASE_URL,
-        connect_args={"check_same_thread": False},
+        connect_args={
+            "check_same_thread": False,
+            "timeout": SQLITE_BUSY_TIMEOUT_MS / 1000,
+        },
         echo=False  # Set to True for debugging SQL queries
     )
+    event.listen(engine, "connect", set_sqlite_pragmas)
 else:
     engine = create_engine(
         DATABASE_URL,
+        pool_size=DB_POOL_SIZE,
+        max_overflow=DB_MAX_OVERFLOW,
+        pool_timeout=DB_POOL_TIMEOUT,
+        pool_recycle=DB_POOL_RECYCLE,
+        pool_pre_ping=DB_POOL_PRE_PING,
+        echo=False
+    )
+
+# Async engine used by the request handlers; the sync engine above is kept
+# for migrations and scripts
+if "sqlite" in DATABASE_URL:
+    async_engine = create_async_engine(
+        ASYNC_DATABASE_URL,
+        connect_args={"timeout": SQLITE_BUSY_TIMEOUT_MS / 1000},
+        poolclass=AsyncAdaptedQueuePool,
+        pool_size=DB_POOL_SIZE,
+        max_overflow=DB_MAX_OVERFLOW,
+        echo=False
+    )
+    event.listen(async_engine.sync_engine, "connect", set_sqlite_pragmas)
+else:
+    async_engine = create_async_engine(
+        ASYNC_DATABASE_URL,
+        pool_size=DB_POOL_SIZE,
+        max_overflow=DB_MAX_OVERFLOW,
+        pool_timeout=DB_POOL_TIMEOUT,
+        pool_recycle=DB_POOL_RECYCLE,
+        pool_pre_ping=DB_POOL_PRE_PING,
         echo=False
     )
 
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+AsyncSessionLocal = sessionmaker(
+    async_engine, class_=AsyncSession, autoflush=False, expire_on_commit=False
+)
 Base = declarative_base()
 
+# Per-statement timing and per-request query counts for /metrics
+instrument_sessions(Session)
+
 def get_db():
     db = SessionLocal()
     try:
@@ -58,6 +148,20 @@ def get_db():
     finally:
         db.close()
 
+async def get_async_db():
+    async with AsyncSessionLocal() as db:
+        try:
+            yield db
+        finally:
+            observe_session(db.sync_session)
+
+async def warm_database():
+    """Open a pooled async connection (TLS, auth, pragmas) ahead of traffic"""
+    started = time.perf_counter()
+    async with async_engine.connect() as conn:
+        await conn.execute(text("SELECT 1"))
+    print(f"🔥 Database pool warmed in {(time.perf_counter() - started) * 1000:.0f} ms")
+
 # Test database connection
 if __name__ == "__main__":
     try:
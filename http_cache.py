@@ -0,0 +1,56 @@
+# http_cache.py - Pre-serialized JSON bodies, ETags and conditional responses
+import hashlib
+
+from fastapi.responses import Response
+
+from serialization import dump_json
+
+NO_CACHE = "no-cache"                  # clients may store, but must revalidate
+PRIVATE_NO_CACHE = "private, no-cache"  # per-user data: never in shared caches
+
+
+def make_etag(body):
+    """Strong ETag for an exact byte representation"""
+    return '"' + hashlib.blake2b(body, digest_size=16).hexdigest() + '"'
+
+
+def etag_matches(if_none_match, etag):
+    """If-None-Match uses weak comparison: `W/` prefixes are ignored"""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    for candidate in if_none_match.split(","):
+        candidate = candidate.strip()
+        if candidate.startswith("W/"):
+            candidate = candidate[2:]
+        if candidate == etag:
+            return True
+    return False
+
+
+def conditional_response(if_none_match, etag, body=None, cache_control=NO_CACHE, build_body=None):
+    """
+    304 when the client already holds `etag`, else the JSON body. Pass
+    `build_body` instead of `body` to skip serialization on a 304.
+    """
+    headers = {"ETag": etag, "Cache-Control": cache_control}
+    if etag_matches(if_none_match, etag):
+        return Response(status_code=304, headers=headers)
+    if body is None:
+        body = build_body()
+    return Response(body, media_type="application/json", headers=headers)
+
+
+class CachedJSON:
+    """A payload serialized once, served with its ETag on every request"""
+
+    __slots__ = ("body", "etag", "cache_control")
+
+    def __init__(self, payload, cache_control=NO_CACHE):
+        self.body = dump_json(payload)
+        self.etag = make_etag(self.body)
+        self.cache_control = cache_control
+
+    def response(self, if_none_match=None):
+        return conditional_response(if_none_match, self.etag, self.body, self.cache_control)
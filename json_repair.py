@@ -0,0 +1,265 @@
+# json_repair.py - Salvage near-JSON model output instead of discarding it
+#
+# Models asked for JSON sometimes wrap it in a code fence, copy the
+# `// 4 more questions` comments from the prompt, leave trailing commas or
+# stop mid-document (max_tokens, dropped stream). parse_lenient() undoes
+# those, and validate_quiz() keeps only questions that fit the quiz schema,
+# so callers can serve what is usable and ask the model for just the rest.
+import json
+import re
+from collections import Counter
+
+from metrics import JSON_REPAIRS
+
+QUIZ_OPTIONS = 4
+
+_FENCE = re.compile(r"^\s*```[a-zA-Z]*\s*|\s*```\s*$")
+_CLOSERS = {"{": "}", "[": "]"}
+
+repair_outcomes = Counter()
+
+
+def strip_fences(text):
+    """Drop a surrounding code fence (text is unchanged if there is none)"""
+    stripped = text.strip()
+    unfenced = _FENCE.sub("", stripped)
+    return unfenced if unfenced != stripped else text
+
+
+def strip_preamble(text):
+    """Drop prose before the first brace (leading whitespace is left alone)"""
+    starts = [i for i in (text.find("{"), text.find("[")) if i >= 0]
+    if not starts or not text[:min(starts)].strip():
+        return text
+    return text[min(starts):]
+
+
+def _scan(text, on_char):
+    """Call on_char(i, c) for every character outside JSON strings"""
+    in_string = escape = False
+    for i, c in enumerate(text):
+        if in_string:
+            if escape:
+                escape = False
+            elif c == "\\":
+                escape = True
+            elif c == '"':
+                in_string = False
+            continue
+        if c == '"':
+            in_string = True
+        on_char(i, c)
+    return in_string
+
+
+def strip_comments(text):
+    """Remove // line and /* block */ comments outside strings"""
+    out, i, in_string, escape = [], 0, False, False
+    while i < len(text):
+        c = text[i]
+        if in_string:
+            out.append(c)
+            if escape:
+                escape = False
+            elif c == "\\":
+                escape = True
+            elif c == '"':
+                in_string = False
+            i += 1
+        elif c == '"':
+            in_string = True
+            out.append(c)
+            i += 1
+        elif text.startswith("//", i):
+            end = text.find("\n", i)
+            i = len(text) if end < 0 else end
+        elif text.startswith("/*", i):
+            end = text.find("*/", i + 2)
+            i = len(text) if end < 0 else end + 2
+        else:
+            out.append(c)
+            i += 1
+    return "".join(out)
+
+
+def remove_trailing_commas(text):
+    """Drop commas directly followed by a closing bracket"""
+    drop = set()
+    last_comma = [None]
+
+    def on_char(i, c):
+        if c == ",":
+            last_comma[0] = i
+        elif c in "}]":
+            if last_comma[0] is not None:
+                drop.add(last_comma[0])
+            last_comma[0] = None
+        elif not c.isspace():
+            last_comma[0] = None
+
+    _scan(text, on_char)
+    return "".join(c for i, c in enumerate(text) if i not in drop)
+
+
+def close_truncated(text):
+    """
+    Cut a document that stops mid-value back to its last complete element
+    and close the open brackets. Returns None if nothing usable is left.
+    """
+    stack = []
+    safe = [None]  # (cut position, closers) after the last complete element
+    expect_key = []
+
+    def mark(position):
+        safe[0] = (position, "".join(_CLOSERS[k] for k in reversed(stack)))
+
+    in_string = escape = False
+    for i, c in enumerate(text):
+        if in_string:
+            if escape:
+                escape = False
+            elif c == "\\":
+                escape = True
+            elif c == '"':
+                in_string = False
+                if stack and not (stack[-1] == "{" and expect_key[-1]):
+                    mark(i + 1)  # a complete string value
+            continue
+        if c == '"':
+            in_string = True
+        elif c in "{[":
+            stack.append(c)
+            expect_key.append(c == "{")
+            mark(i + 1)
+        elif c in "}]":
+            if not stack:
+                break
+            stack.pop()
+            expect_key.pop()
+            mark(i + 1)
+            if not stack:
+                return text[:i + 1]
+        elif c == ":" and stack:
+            expect_key[-1] = False
+        elif c == "," and stack:
+            mark(i)
+            if stack[-1] == "{":
+                expect_key[-1] = True
+
+    if safe[0] is None:
+        return None
+    position, closers = safe[0]
+    return remove_trailing_commas(text[:position].rstrip().rstrip(",") + closers)
+
+
+def parse_lenient(text):
+    """
+    (value, repairs) for model output, where repairs names the fixes that
+    were needed ([] if it parsed as-is). Raises ValueError if unsalvageable.
+    """
+    text = text or ""
+    try:
+        return json.loads(text), []
+    except json.JSONDecodeError:
+        pass
+
+    repairs = []
+    for name, fix in (("fence", strip_fences), ("preamble", strip_preamble),
+                      ("comments", strip_comments), ("trailing_commas", remove_trailing_commas)):
+        fixed = fix(text)
+        if fixed != text:
+            repairs.append(name)
+            text = fixed
+    try:
+        return json.loads(text), repairs
+    except json.JSONDecodeError:
+        pass
+
+    closed = close_truncated(text)
+    if closed is not None:
+        try:
+            return json.loads(closed), repairs + ["truncated"]
+        except json.JSONDecodeError:
+            pass
+    raise ValueError(f"unrepairable JSON ({', '.join(repairs) or 'no fix applied'})")
+
+
+# ============================================================================
+# QUIZ SCHEMA
+# ============================================================================
+_QUESTION_KEYS = ("q", "question")
+_ANSWER_KEYS = ("answer", "correct_answer", "correct")
+
+
+def _first(item, keys):
+    for key in keys:
+        if key in item:
+            return item[key]
+    return None
+
+
+def validate_question(item):
+    """
+    The question normalized to {"q", "options", "answer"}, or None if it
+    doesn't fit: a question, 4 distinct options, the answer among them (an
+    option letter or index is mapped to its option unless it is one itself).
+    """
+    if not isinstance(item, dict):
+        return None
+    question = _first(item, _QUESTION_KEYS)
+    options = item.get("options")
+    answer = _first(item, _ANSWER_KEYS)
+    if not isinstance(question, str) or not question.strip() or not isinstance(options, list):
+        return None
+    options = [str(o).strip() for o in options]
+    if len(options) != QUIZ_OPTIONS or len(set(options)) != QUIZ_OPTIONS or not all(options):
+        return None
+
+    # The answer as given wins: options may themselves be numbers or letters
+    text = str(answer).strip() if answer is not None else ""
+    if text not in options:
+        if isinstance(answer, int) and not isinstance(answer, bool) and 0 <= answer < QUIZ_OPTIONS:
+            text = options[answer]
+        elif len(text) == 1 and "A" <= text.upper() <= "D":
+            text = options["ABCD".index(text.upper())]
+    answer = text
+    if answer not in options:
+        return None
+    return {"q": question.strip(), "options": options, "answer": answer}
+
+
+def validate_quiz(items):
+    """Questions that fit the schema, normalized, without duplicates"""
+    valid, seen = [], set()
+    for item in items if isinstance(items, list) else []:
+        question = validate_question(item)
+        if question is not None and question["q"] not in seen:
+            seen.add(question["q"])
+            valid.append(question)
+    return valid
+
+
+# ============================================================================
+# REPORTING
+# ============================================================================
+def record_outcome(endpoint, outcome):
+    """
+    clean: valid as generated; repaired: fixed locally; topped_up: missing
+    questions re-asked; partial: served short; failed: fallback served
+    """
+    repair_outcomes[outcome] += 1
+    JSON_REPAIRS.inc(endpoint, outcome)
+
+
+def repair_stats():
+    """
+    Success counts only fully salvaged output (repaired, topped_up); a
+    partial quiz was served short and counts against it like a failure
+    """
+    needed = sum(n for outcome, n in repair_outcomes.items() if outcome != "clean")
+    salvaged = repair_outcomes["repaired"] + repair_outcomes["topped_up"]
+    return {
+        **{outcome: repair_outcomes[outcome] for outcome in ("clean", "repaired", "topped_up", "partial", "failed")},
+        "repair_success_rate": round(salvaged / needed, 4) if needed else None,
+        "partial_rate": round(repair_outcomes["partial"] / needed, 4) if needed else None,
+    }
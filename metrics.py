@@ -0,0 +1,244 @@
+# metrics.py - Minimal Prometheus-style metrics (text exposition format)
+import bisect
+import time
+
+from starlette.routing import Match
+
+# Latency buckets in seconds: sub-millisecond cache hits up to slow LLM calls
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5,
+                   1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(names, values):
+    if not names:
+        return ""
+    pairs = ",".join(f'{name}="{_escape(value)}"' for name, value in zip(names, values))
+    return "{" + pairs + "}"
+
+
+class _Metric:
+    kind = "untyped"
+
+    def __init__(self, name, documentation, labels=()):
+        self.name = name
+        self.documentation = documentation
+        self.labels = tuple(labels)
+        self._values = {}
+
+    def header(self):
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, *labels, amount=1):
+        self._values[labels] = self._values.get(labels, 0) + amount
+
+    def total(self):
+        return sum(self._values.values())
+
+    def render(self):
+        lines = self.header()
+        for labels, value in self._values.items():
+            lines.append(f"{self.name}{_format_labels(self.labels, labels)} {value}")
+        return lines
+
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def dec(self, *labels, amount=1):
+        self.inc(*labels, amount=-amount)
+
+    def set(self, *labels, value):
+        self._values[labels] = value
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name, documentation, labels=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labels)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value, *labels):
+        state = self._values.get(labels)
+        if state is None:
+            # [per-bucket counts..., +Inf count], sum
+            state = self._values[labels] = [[0] * (len(self.buckets) + 1), 0.0]
+        state[0][bisect.bisect_left(self.buckets, value)] += 1
+        state[1] += value
+
+    def render(self):
+        lines = self.header()
+        for labels, (counts, total) in self._values.items():
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                le = "+Inf" if bound == float("inf") else repr(bound)
+                label_text = _format_labels(self.labels + ("le",), labels + (le,))
+                lines.append(f"{self.name}_bucket{label_text} {cumulative}")
+            label_text = _format_labels(self.labels, labels)
+            lines.append(f"{self.name}_sum{label_text} {total}")
+            lines.append(f"{self.name}_count{label_text} {cumulative}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = []
+        self._collectors = []
+
+    def register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def add_collector(self, collect):
+        """`collect()` returns extra exposition lines at scrape time"""
+        self._collectors.append(collect)
+
+    def render(self):
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        for collect in self._collectors:
+            lines.extend(collect())
+        return "\n".join(lines) + "\n"
+
+
+def gauge_lines(name, documentation, samples, labels=()):
+    """Exposition lines for values computed at scrape time"""
+    lines = [f"# HELP {name} {documentation}", f"# TYPE {name} gauge"]
+    for label_values, value in samples:
+        lines.append(f"{name}{_format_labels(labels, label_values)} {value}")
+    return lines
+
+
+registry = Registry()
+
+HTTP_REQUESTS = registry.register(Counter(
+    "http_requests_total", "HTTP requests handled", ("method", "route", "status")))
+HTTP_LATENCY = registry.register(Histogram(
+    "http_request_duration_seconds", "HTTP request latency", ("method", "route")))
+HTTP_IN_FLIGHT = registry.register(Gauge(
+    "http_requests_in_flight", "HTTP requests currently being handled", ("route",)))
+
+DB_QUERY_LATENCY = registry.register(Histogram(
+    "db_query_duration_seconds", "Duration of statements run through a DB session", ("operation",)))
+DB_SESSION_QUERIES = registry.register(Histogram(
+    "db_session_queries", "Statements executed per request DB session",
+    buckets=(0, 1, 2, 3, 4, 5, 6, 8, 10, 15, 20, 50)))
+DB_SESSION_LATENCY = registry.register(Histogram(
+    "db_session_query_seconds", "Total statement time per request DB session"))
+
+LLM_REQUESTS = registry.register(Counter(
+    "llm_requests_total", "OpenRouter calls by outcome", ("endpoint", "model", "outcome")))
+LLM_LATENCY = registry.register(Histogram(
+    "llm_request_duration_seconds", "OpenRouter call latency (full response)", ("endpoint", "model")))
+LLM_FIRST_TOKEN = registry.register(Histogram(
+    "llm_time_to_first_token_seconds", "Time to first streamed token", ("endpoint", "model")))
+LLM_TOKENS = registry.register(Counter(
+    "llm_tokens_total", "Tokens reported by OpenRouter usage", ("endpoint", "model", "kind")))
+LLM_RESILIENCE = registry.register(Counter(
+    "llm_resilience_events_total", "Calls rejected by the breaker, past their deadline or hedged",
+    ("endpoint", "event")))
+MODEL_ROUTES = registry.register(Counter(
+    "llm_model_routes_total", "Model chosen per call and why", ("endpoint", "model", "reason")))
+
+PROMPT_TOKENS = registry.register(Histogram(
+    "llm_prompt_tokens", "Locally counted input tokens per prompt", ("endpoint",),
+    buckets=(100, 250, 500, 1000, 1500, 2000, 3000, 4000, 6000, 8000)))
+PROMPT_TRUNCATIONS = registry.register(Counter(
+    "llm_prompt_truncations_total", "Prompt parts cut or compacted to fit the budget", ("endpoint", "part")))
+
+PREFETCH_EVENTS = registry.register(Counter(
+    "prefetch_events_total", "Speculative lesson prefetch: scheduled, generated, hit, dropped_*", ("event",)))
+
+JSON_REPAIRS = registry.register(Counter(
+    "llm_json_repairs_total", "JSON model output: clean, repaired, topped_up, partial, failed",
+    ("endpoint", "outcome")))
+
+FALLBACKS = registry.register(Counter(
+    "fallback_responses_total", "Responses served from a fallback path", ("kind",)))
+
+
+# ============================================================================
+# HTTP MIDDLEWARE
+# ============================================================================
+class MetricsMiddleware:
+    """Pure ASGI middleware: per-route latency, status counts, in-flight"""
+
+    def __init__(self, app):
+        self.app = app
+        self._route_cache = {}
+
+    def _route_label(self, scope):
+        key = (scope["method"], scope["path"])
+        label = self._route_cache.get(key)
+        if label is None:
+            label = "unmatched"
+            for route in scope["app"].router.routes:
+                match, _ = route.matches(scope)
+                if match == Match.FULL:
+                    label = getattr(route, "path", label)
+                    # Only static paths are cached: keying parameterized ones
+                    # (/api/chat/session/{id}) by raw path would grow forever
+                    if not getattr(route, "param_convertors", None):
+                        self._route_cache[key] = label
+                    break
+        return label
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        method = scope["method"]
+        route = self._route_label(scope)
+        status = {"code": 500}
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                status["code"] = message["status"]
+            await send(message)
+
+        HTTP_IN_FLIGHT.inc(route)
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            HTTP_LATENCY.observe(time.perf_counter() - started, method, route)
+            HTTP_REQUESTS.inc(method, route, status["code"])
+            HTTP_IN_FLIGHT.dec(route)
+
+
+# ============================================================================
+# DATABASE INSTRUMENTATION
+# ============================================================================
+def instrument_sessions(session_class):
+    """Time every statement executed through a Session and count per session"""
+    from sqlalchemy import event
+
+    @event.listens_for(session_class, "do_orm_execute")
+    def _time_statement(orm_execute_state):
+        started = time.perf_counter()
+        try:
+            return orm_execute_state.invoke_statement()
+        finally:
+            elapsed = time.perf_counter() - started
+            operation = orm_execute_state.statement.__visit_name__
+            DB_QUERY_LATENCY.observe(elapsed, operation)
+            info = orm_execute_state.session.info
+            info["queries"] = info.get("queries", 0) + 1
+            info["query_seconds"] = info.get("query_seconds", 0.0) + elapsed
+
+
+def observe_session(session):
+    info = session.info
+    DB_SESSION_QUERIES.observe(info.pop("queries", 0))
+    DB_SESSION_LATENCY.observe(info.pop("query_seconds", 0.0))
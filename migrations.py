@@ -0,0 +1,63 @@
+# migrations.py - Schema creation and in-place data migrations
+import json
+
+from sqlalchemy import inspect, text
+from sqlalchemy.orm import Session
+
+from database import Base, engine
+from models import CompletedTopicDB, UserDB
+
+
+def migrate_completed_topics(bind):
+    """
+    Move topics from the legacy UserDB.completed_topics_in_rank JSON column
+    into the completed_topics table. Safe to run repeatedly: migrated rows
+    have their JSON column reset to "[]".
+    """
+    with Session(bind=bind) as db:
+        users = (
+            db.query(UserDB)
+            .filter(UserDB.completed_topics_in_rank.isnot(None))
+            .filter(UserDB.completed_topics_in_rank.notin_(["", "[]"]))
+            .all()
+        )
+        for user in users:
+            try:
+                topics = json.loads(user.completed_topics_in_rank)
+            except (TypeError, ValueError):
+                topics = []
+
+            existing = {
+                row.topic for row in db.query(CompletedTopicDB.topic)
+                .filter(CompletedTopicDB.user_id == user.id, CompletedTopicDB.rank == user.rank)
+            }
+            for topic in topics:
+                if isinstance(topic, str) and topic not in existing:
+                    db.add(CompletedTopicDB(user_id=user.id, rank=user.rank, topic=topic))
+                    existing.add(topic)
+
+            user.completed_topics_in_rank = "[]"
+
+        db.commit()
+        if users:
+            print(f"🔧 Migrated completed topics for {len(users)} user(s)")
+
+
+def add_user_version_column(bind):
+    """Add users.version to databases created before it existed"""
+    columns = {column["name"] for column in inspect(bind).get_columns("users")}
+    if "version" not in columns:
+        with bind.begin() as conn:
+            conn.execute(text("ALTER TABLE users ADD COLUMN version INTEGER NOT NULL DEFAULT 0"))
+        print("🔧 Added users.version column")
+
+
+def run_migrations(bind=engine):
+    Base.metadata.create_all(bind=bind)
+    add_user_version_column(bind)
+    migrate_completed_topics(bind)
+
+
+if __name__ == "__main__":
+    run_migrations()
+    print("✅ Migrations complete")
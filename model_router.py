@@ -0,0 +1,177 @@
+# model_router.py - Per-endpoint choice among several OpenRouter models
+import os
+import random
+from collections import Counter, deque
+
+from metrics import MODEL_ROUTES
+
+DEFAULT_MODEL = os.environ.get("LLM_DEFAULT_MODEL", "meta-llama/llama-3.1-8b-instruct")
+
+# Candidates in order of preference (e.g. best quality first), per endpoint:
+#   LLM_MODELS_ASSISTED_LESSON=meta-llama/llama-3.1-70b-instruct,meta-llama/llama-3.1-8b-instruct
+#   LLM_MODELS_TRIVIA=meta-llama/llama-3.2-3b-instruct
+# Streamed and prefetch variants use their base endpoint's list unless set.
+ENDPOINT_ALIASES = {
+    "self_lesson_stream": "self_lesson",
+    "assisted_lesson_stream": "assisted_lesson",
+    "chat_stream": "chat",
+    "prefetch_assisted": "assisted_lesson",
+    "prefetch_self": "self_lesson",
+}
+
+# Latency targets in seconds (LLM_LATENCY_TARGET_<ENDPOINT>); streamed
+# endpoints are measured to their first token
+DEFAULT_TARGETS = {
+    "chat": 4.0,
+    "chat_stream": 1.5,
+    "trivia": 8.0,
+    "assisted_lesson": 6.0,
+    "self_lesson": 15.0,
+    "self_lesson_stream": 2.0,
+    "assisted_lesson_stream": 2.0,
+    "quiz_topup": 5.0,
+}
+DEFAULT_TARGET = float(os.environ.get("LLM_LATENCY_TARGET_DEFAULT", "30"))
+
+LLM_ROUTER_WINDOW = int(os.environ.get("LLM_ROUTER_WINDOW", "50"))
+LLM_ROUTER_MIN_SAMPLES = int(os.environ.get("LLM_ROUTER_MIN_SAMPLES", "5"))
+LLM_ROUTER_EXPLORE = float(os.environ.get("LLM_ROUTER_EXPLORE", "0.05"))
+LLM_ROUTER_MAX_ERROR_RATE = float(os.environ.get("LLM_ROUTER_MAX_ERROR_RATE", "0.2"))
+LLM_ROUTER_MIN_JSON_VALIDITY = float(os.environ.get("LLM_ROUTER_MIN_JSON_VALIDITY", "0.9"))
+
+
+def _env_key(endpoint):
+    return endpoint.upper()
+
+
+def _rate(window):
+    return sum(window) / len(window) if window else None
+
+
+class ModelStats:
+    """Moving windows of one model's latency, errors and JSON validity"""
+
+    def __init__(self, window=LLM_ROUTER_WINDOW):
+        self.latency = deque(maxlen=window)
+        self.outcomes = deque(maxlen=window)  # True = ok
+        self.json = deque(maxlen=window)  # True = parsed and valid
+
+    def latency_pct(self, pct):
+        if not self.latency:
+            return None
+        ordered = sorted(self.latency)
+        return ordered[min(len(ordered) - 1, int(pct / 100 * len(ordered)))]
+
+    def sampled(self):
+        return max(len(self.latency), len(self.outcomes)) >= LLM_ROUTER_MIN_SAMPLES
+
+    def meets(self, target):
+        if not self.sampled():
+            return True  # optimistic until there is data
+        error_rate = 1 - _rate(self.outcomes) if self.outcomes else 0.0
+        validity = _rate(self.json)
+        latency = self.latency_pct(90)
+        # Only errors so far: judge on error rate and validity alone
+        return ((latency is None or latency <= target)
+                and error_rate <= LLM_ROUTER_MAX_ERROR_RATE
+                and (validity is None or validity >= LLM_ROUTER_MIN_JSON_VALIDITY))
+
+    def score(self):
+        """Lower is better: p90 latency inflated by failures and bad JSON"""
+        usable = (_rate(self.outcomes) if self.outcomes else 1.0) * (_rate(self.json) if self.json else 1.0)
+        return (self.latency_pct(90) or float("inf")) / max(usable, 0.05)
+
+    def stats(self):
+        p50, p90 = self.latency_pct(50), self.latency_pct(90)
+        return {
+            "samples": len(self.outcomes),
+            "p50": round(p50, 3) if p50 is not None else None,
+            "p90": round(p90, 3) if p90 is not None else None,
+            "error_rate": round(1 - _rate(self.outcomes), 4) if self.outcomes else None,
+            "json_validity": round(_rate(self.json), 4) if self.json else None,
+        }
+
+
+class Route:
+    def __init__(self, endpoint, default_model):
+        base = ENDPOINT_ALIASES.get(endpoint, endpoint)
+        configured = (os.environ.get(f"LLM_MODELS_{_env_key(endpoint)}")
+                      or os.environ.get(f"LLM_MODELS_{_env_key(base)}") or default_model)
+        self.candidates = [m.strip() for m in configured.split(",") if m.strip()] or [default_model]
+        self.target = float(os.environ.get(f"LLM_LATENCY_TARGET_{_env_key(endpoint)}",
+                                           DEFAULT_TARGETS.get(endpoint, DEFAULT_TARGET)))
+        self.models = {model: ModelStats() for model in self.candidates}
+        self.decisions = Counter()
+        self.last = None
+
+    def choose(self):
+        if len(self.candidates) == 1:
+            return self.candidates[0], "only"
+        if random.random() < LLM_ROUTER_EXPLORE:
+            return random.choice(self.candidates), "explore"
+        for model in self.candidates:
+            if self.models[model].meets(self.target):
+                return model, "target" if self.models[model].sampled() else "unsampled"
+        return min(self.candidates, key=lambda m: self.models[m].score()), "fastest"
+
+
+class ModelRouter:
+    """
+    Sends each call to the most preferred candidate whose recent p90
+    latency meets the endpoint's target (with few errors and, where JSON is
+    expected, valid JSON); if none does, to the best scoring one. A small
+    share of calls explores the others so their stats stay current.
+    """
+
+    def __init__(self, default_model):
+        self.default_model = default_model
+        self._routes = {}
+
+    def _route(self, endpoint):
+        route = self._routes.get(endpoint)
+        if route is None:
+            route = self._routes[endpoint] = Route(endpoint, self.default_model)
+        return route
+
+    def choose(self, endpoint):
+        route = self._route(endpoint)
+        model, reason = route.choose()
+        route.decisions[(model, reason)] += 1
+        route.last = {"model": model, "reason": reason}
+        MODEL_ROUTES.inc(endpoint, model, reason)
+        return model
+
+    def _stats(self, endpoint, model):
+        route = self._route(endpoint)
+        stats = route.models.get(model)
+        if stats is None:
+            stats = route.models[model] = ModelStats()
+        return stats
+
+    def observe(self, endpoint, model, seconds, outcome):
+        """One call finished: outcome as in llm_requests_total"""
+        stats = self._stats(endpoint, model)
+        # Errors say nothing about speed, and cancelled calls (lost hedge,
+        # client gone) were cut short: their time would flatter the model
+        if outcome not in ("error", "cancelled"):
+            stats.latency.append(seconds)
+        if outcome != "cancelled":
+            stats.outcomes.append(outcome == "ok")
+
+    def record_json(self, endpoint, model, valid):
+        self._stats(endpoint, model).json.append(bool(valid))
+
+    def stats(self):
+        return {
+            endpoint: {
+                "target": route.target,
+                "candidates": route.candidates,
+                "last": route.last,
+                "decisions": [{"model": m, "reason": r, "count": n} for (m, r), n in route.decisions.items()],
+                "models": {model: stats.stats() for model, stats in route.models.items()},
+            }
+            for endpoint, route in self._routes.items()
+        }
+
+
+router = ModelRouter(DEFAULT_MODEL)
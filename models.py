@@ -1,8 +1,7 @@
 # models.py
-from sqlalchemy import Column, Integer, String, Text
+from sqlalchemy import Column, ForeignKey, Index, Integer, String, Text
 from sqlalchemy.orm import relationship
 from database import Base
-import json
 from pydantic import BaseModel, Field
 from typing import Optional, List
 
@@ -21,19 +20,26 @@ class UserDB(Base):
     level = Column(Integer, default=1)
     rank = Column(String, default="Beginner")
     topics_completed = Column(Integer, default=0)
-    completed_topics_in_rank = Column(Text, default="[]")  # store JSON list
+    # Legacy JSON list, superseded by CompletedTopicDB (see migrations.py)
+    completed_topics_in_rank = Column(Text, default="[]")
 
     school = Column(String, nullable=True)
     description = Column(String, nullable=True)
 
-    def get_completed_topics(self):
-        try:
-            return json.loads(self.completed_topics_in_rank)
-        except:
-            return []
+    # Bumped on every write; used for optimistic checks and cache validators
+    version = Column(Integer, nullable=False, default=0, server_default="0")
 
-    def set_completed_topics(self, topics):
-        self.completed_topics_in_rank = json.dumps(topics)
+
+class CompletedTopicDB(Base):
+    __tablename__ = "completed_topics"
+    __table_args__ = (
+        Index("ix_completed_topics_user_rank_topic", "user_id", "rank", "topic", unique=True),
+    )
+
+    id = Column(Integer, primary_key=True)
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
+    rank = Column(String, nullable=False)
+    topic = Column(String, nullable=False)
 
 
 # -------------------------
@@ -66,7 +72,7 @@ class AuthRequest(BaseModel):
 
 
 class SettingsRequest(BaseModel):
-    username: str
+    username: Optional[str] = None  # legacy; prefer the session token
     avatar: Optional[str] = None
     school: Optional[str] = None
     description: Optional[str] = None
@@ -74,19 +80,19 @@ class SettingsRequest(BaseModel):
 
 
 class XPRequest(BaseModel):
-    username: str
+    username: Optional[str] = None  # legacy; prefer the session token
     topic: str
     score: int
     level: int
 
 
 class BonusRequest(BaseModel):
-    username: str
+    username: Optional[str] = None  # legacy; prefer the session token
     score: int
 
 
 class DashboardRequest(BaseModel):
-    username: str
+    username: Optional[str] = None  # legacy; prefer the session token
 
 
 class LessonRequest(BaseModel):
@@ -96,16 +102,29 @@ class LessonRequest(BaseModel):
     level: int
 
 
+class LessonBatchRequest(BaseModel):
+    lessons: List[LessonRequest]
+
+
 class ChatMessage(BaseModel):
     author: str
     content: str
 
 
-class ChatRequest(BaseModel):
+class ChatSessionRequest(BaseModel):
     lessonContent: str
-    messages: List[ChatMessage]
     language: str
 
 
+class ChatRequest(BaseModel):
+    # Session mode: the context lives on the server, send only the new turn
+    sessionId: Optional[str] = None
+    message: Optional[str] = None
+    # Legacy mode: full lesson and transcript on every turn
+    lessonContent: Optional[str] = None
+    messages: Optional[List[ChatMessage]] = None
+    language: Optional[str] = None
+
+
 class TriviaRequest(BaseModel):
     language: str
@@ -0,0 +1,115 @@
+# passwords.py - scrypt password hashing in a bounded process pool
+import asyncio
+import base64
+import hashlib
+import hmac
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+# Cost factor: scrypt N = 2 ** PASSWORD_SCRYPT_LOG_N (memory = 128 * r * N bytes)
+PASSWORD_SCRYPT_LOG_N = int(os.environ.get("PASSWORD_SCRYPT_LOG_N", "14"))
+PASSWORD_SCRYPT_R = 8
+PASSWORD_SCRYPT_P = 1
+PASSWORD_HASH_WORKERS = int(os.environ.get("PASSWORD_HASH_WORKERS", str(min(2, os.cpu_count() or 1))))
+
+HASH_PREFIX = "scrypt"
+_SALT_BYTES = 16
+_KEY_BYTES = 32
+
+_executor = None
+
+
+def _b64(raw):
+    return base64.b64encode(raw).decode("ascii")
+
+
+def _scrypt(password, salt, log_n, r, p):
+    n = 2 ** log_n
+    return hashlib.scrypt(
+        password.encode("utf-8"), salt=salt, n=n, r=r, p=p,
+        maxmem=256 * r * n, dklen=_KEY_BYTES,
+    )
+
+
+def _hash_sync(password, log_n):
+    salt = os.urandom(_SALT_BYTES)
+    key = _scrypt(password, salt, log_n, PASSWORD_SCRYPT_R, PASSWORD_SCRYPT_P)
+    return f"{HASH_PREFIX}${log_n}${PASSWORD_SCRYPT_R}${PASSWORD_SCRYPT_P}${_b64(salt)}${_b64(key)}"
+
+
+def _verify_sync(password, stored):
+    _, log_n, r, p, salt, key = stored.split("$")
+    candidate = _scrypt(password, base64.b64decode(salt), int(log_n), int(r), int(p))
+    return hmac.compare_digest(candidate, base64.b64decode(key))
+
+
+def is_hashed(stored):
+    return bool(stored) and stored.startswith(HASH_PREFIX + "$")
+
+
+def needs_rehash(stored):
+    """True for legacy plaintext rows and hashes made with another cost"""
+    if not is_hashed(stored):
+        return True
+    return stored.split("$")[1] != str(PASSWORD_SCRYPT_LOG_N)
+
+
+def get_executor():
+    global _executor
+    if _executor is None:
+        # spawn: forking a process that already runs an event loop and
+        # driver threads is unsafe
+        _executor = ProcessPoolExecutor(
+            max_workers=PASSWORD_HASH_WORKERS,
+            mp_context=multiprocessing.get_context("spawn"),
+        )
+    return _executor
+
+
+async def hash_password(password):
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(get_executor(), _hash_sync, password or "", PASSWORD_SCRYPT_LOG_N)
+
+
+async def verify_password(password, stored):
+    """
+    Check `password` against a stored value. Returns (ok, needs_rehash);
+    legacy plaintext values are compared in constant time and always
+    reported as needing a rehash.
+    """
+    password = password or ""
+    if not is_hashed(stored):
+        ok = hmac.compare_digest((stored or "").encode("utf-8"), password.encode("utf-8"))
+        return ok, ok
+
+    loop = asyncio.get_running_loop()
+    ok = await loop.run_in_executor(get_executor(), _verify_sync, password, stored)
+    return ok, ok and needs_rehash(stored)
+
+
+# Same cost as a real hash; the key matches no password
+_DUMMY_HASH = (f"{HASH_PREFIX}${PASSWORD_SCRYPT_LOG_N}${PASSWORD_SCRYPT_R}${PASSWORD_SCRYPT_P}"
+               f"${_b64(bytes(_SALT_BYTES))}${_b64(bytes(_KEY_BYTES))}")
+
+
+async def verify_unknown_user(password):
+    """
+    Pay for a verify when the username doesn't exist, so signin takes as
+    long as for a real user and response time doesn't reveal which exist
+    """
+    await verify_password(password, _DUMMY_HASH)
+
+
+async def warm():
+    """Start the worker processes now rather than on the first signin"""
+    loop = asyncio.get_running_loop()
+    executor = get_executor()
+    await asyncio.gather(*(loop.run_in_executor(executor, os.getpid) for _ in range(PASSWORD_HASH_WORKERS)))
+
+
+def shutdown():
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=False, cancel_futures=True)
+        _executor = None
@@ -0,0 +1,191 @@
+# prefetch.py - Speculative generation of a student's likely next lesson
+import asyncio
+import os
+import time
+from collections import Counter, deque
+
+from cache import TTLCache, lesson_cache, lesson_key
+from metrics import HTTP_IN_FLIGHT, PREFETCH_EVENTS
+from models import LessonRequest
+
+PREFETCH_ENABLED = os.environ.get("PREFETCH_ENABLED", "1") == "1"
+PREFETCH_WORKERS = int(os.environ.get("PREFETCH_WORKERS", "2"))
+PREFETCH_QUEUE_SIZE = int(os.environ.get("PREFETCH_QUEUE_SIZE", "100"))
+# Upstream generations allowed per PREFETCH_BUDGET_WINDOW seconds
+PREFETCH_BUDGET = float(os.environ.get("PREFETCH_BUDGET", "120"))
+PREFETCH_BUDGET_WINDOW = float(os.environ.get("PREFETCH_BUDGET_WINDOW", "3600"))
+# Queued work is dropped while more requests than this are being served
+PREFETCH_MAX_IN_FLIGHT = int(os.environ.get("PREFETCH_MAX_IN_FLIGHT", "8"))
+
+_DAY = 24 * 3600
+
+
+def _norm(topic):
+    return " ".join(str(topic).split()).casefold()
+
+
+class TokenBucket:
+    def __init__(self, capacity, window):
+        self.capacity = capacity
+        self.rate = capacity / window if window > 0 else float("inf")
+        self.tokens = capacity
+        self.updated = time.monotonic()
+
+    def take(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens < 1:
+            return False
+        self.tokens -= 1
+        return True
+
+
+class Prefetcher:
+    """
+    Learns which topic follows which (from students' completion order and
+    from batch requests, which list a unit in order) and, when a topic is
+    completed, generates the likely next lesson in the background so the
+    student's request is a cache hit.
+    """
+
+    def __init__(self, generators, workers=PREFETCH_WORKERS, queue_size=PREFETCH_QUEUE_SIZE,
+                 budget=PREFETCH_BUDGET, budget_window=PREFETCH_BUDGET_WINDOW,
+                 max_in_flight=PREFETCH_MAX_IN_FLIGHT):
+        self._generators = generators  # kind -> async fn(LessonRequest, endpoint)
+        self.workers = workers
+        self.max_in_flight = max_in_flight
+        self._budget = TokenBucket(budget, budget_window)
+        self._queue = deque(maxlen=queue_size)
+        self._wakeup = None
+        self._tasks = []
+        self._pending = set()
+        # topic -> Counter of following topics (keys normalized, values as sent)
+        self._transitions = TTLCache(5000, 7 * _DAY, name="prefetch_transitions")
+        # topic -> {kind: LessonRequest} last seen, for language / rank / level
+        self._contexts = TTLCache(5000, _DAY, name="prefetch_contexts")
+        self._last_topic = TTLCache(10000, _DAY, name="prefetch_last_topic")
+        # lesson cache keys filled by prefetch and not yet requested
+        self._prefetched = TTLCache(lesson_cache.maxsize, lesson_cache.ttl, name="prefetched")
+        self.generated = 0
+        self.hits = 0
+
+    # ------------------------------------------------------------------
+    # Signals from the request path (all O(1), no awaits)
+    # ------------------------------------------------------------------
+    def note_lesson(self, kind, data):
+        contexts = self._contexts.get(_norm(data.topic)) or {}
+        contexts[kind] = data
+        self._contexts.set(_norm(data.topic), contexts)
+
+    def note_sequence(self, topics):
+        for previous, following in zip(topics, topics[1:]):
+            self._observe(previous, following)
+
+    def claim(self, cache_key):
+        """Called on a lesson cache hit; counts it if prefetch filled it"""
+        if self._prefetched.pop(cache_key) is not None:
+            self.hits += 1
+            PREFETCH_EVENTS.inc("hit")
+
+    def completed(self, user_id, topic, rank):
+        """A student finished `topic`; queue their likely next lesson"""
+        previous = self._last_topic.get(user_id)
+        self._last_topic.set(user_id, topic)
+        if previous is not None and _norm(previous) != _norm(topic):
+            self._observe(previous, topic)
+        if not self._tasks:
+            return
+
+        following = self._predict(topic)
+        contexts = self._contexts.get(_norm(topic))
+        if following is None or not contexts:
+            return
+        for kind, seen in contexts.items():
+            request = LessonRequest(topic=following, language=seen.language, rank=rank, level=seen.level)
+            self._enqueue(kind, request)
+
+    # ------------------------------------------------------------------
+    def _observe(self, previous, following):
+        key = _norm(previous)
+        counts = self._transitions.get(key) or Counter()
+        counts[following.strip()] += 1
+        self._transitions.set(key, counts)
+
+    def _predict(self, topic):
+        counts = self._transitions.get(_norm(topic))
+        if not counts:
+            return None
+        return counts.most_common(1)[0][0]
+
+    def _enqueue(self, kind, request):
+        key = lesson_key(kind, request)
+        if key in self._pending or key in lesson_cache:
+            return
+        if len(self._queue) == self._queue.maxlen:
+            _, _, dropped = self._queue.popleft()
+            self._pending.discard(dropped)
+            PREFETCH_EVENTS.inc("dropped_queue")
+        self._pending.add(key)
+        self._queue.append((kind, request, key))
+        PREFETCH_EVENTS.inc("scheduled")
+        self._wakeup.set()
+
+    def _busy(self):
+        return HTTP_IN_FLIGHT.total() > self.max_in_flight
+
+    async def _worker(self):
+        while True:
+            if not self._queue:
+                self._wakeup.clear()
+                await self._wakeup.wait()
+                continue
+
+            kind, request, key = self._queue.popleft()
+            try:
+                if self._busy():
+                    PREFETCH_EVENTS.inc("dropped_load")
+                    continue
+                if key in lesson_cache:
+                    continue
+                if not self._budget.take():
+                    PREFETCH_EVENTS.inc("dropped_budget")
+                    continue
+
+                await self._generators[kind](request, f"prefetch_{kind}")
+                if key in lesson_cache:
+                    self._prefetched.set(key, True)
+                    self.generated += 1
+                    PREFETCH_EVENTS.inc("generated")
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                PREFETCH_EVENTS.inc("failed")
+                print(f"⚠️ Prefetch of {kind} lesson '{request.topic}' failed: {e}")
+            finally:
+                self._pending.discard(key)
+
+    def start(self):
+        if self._tasks or not PREFETCH_ENABLED:
+            return
+        self._wakeup = asyncio.Event()
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        self._queue.clear()
+        self._pending.clear()
+
+    def stats(self):
+        return {
+            "enabled": bool(self._tasks),
+            "queued": len(self._queue),
+            "budget_left": int(self._budget.tokens),
+            "generated": self.generated,
+            "hits": self.hits,
+            "hit_rate": round(self.hits / self.generated, 4) if self.generated else 0.0,
+            "known_topics": len(self._transitions),
+        }
@@ -0,0 +1,299 @@
+# prompts.py - Token-budgeted prompt assembly for the OpenRouter calls
+#
+# Every builder returns a `messages` list whose size is bounded no matter
+# what the client sends. Fixed instructions come first (system message) and
+# request-specific values last, so upstream prompt caching can reuse the
+# prefix across requests.
+import functools
+import os
+
+from metrics import PROMPT_TOKENS, PROMPT_TRUNCATIONS
+
+# "estimate" (default, no dependencies) or "tiktoken" (if installed)
+PROMPT_TOKENIZER = os.environ.get("PROMPT_TOKENIZER", "estimate")
+
+PROMPT_FIELD_TOKENS = int(os.environ.get("PROMPT_FIELD_TOKENS", "48"))  # topic, rank, language
+CHAT_PROMPT_BUDGET = int(os.environ.get("CHAT_PROMPT_BUDGET", "3000"))
+CHAT_LESSON_TOKENS = int(os.environ.get("CHAT_LESSON_TOKENS", "1500"))
+CHAT_MESSAGE_TOKENS = int(os.environ.get("CHAT_MESSAGE_TOKENS", "400"))
+CHAT_SUMMARY_TOKENS = int(os.environ.get("CHAT_SUMMARY_TOKENS", "150"))
+
+TRUNCATION_MARKER = " […]"
+
+
+# ============================================================================
+# TOKEN COUNTING
+# ============================================================================
+_encoding = None
+
+
+def _get_encoding():
+    global _encoding, PROMPT_TOKENIZER
+    if _encoding is None and PROMPT_TOKENIZER == "tiktoken":
+        try:
+            import tiktoken
+            _encoding = tiktoken.get_encoding("cl100k_base")
+        except Exception as e:
+            print(f"⚠️ tiktoken unavailable ({e}) - estimating prompt tokens")
+            PROMPT_TOKENIZER = "estimate"
+    return _encoding
+
+
+def count_tokens(text):
+    encoding = _get_encoding()
+    if encoding is not None:
+        return len(encoding.encode(text))
+    # ~4 bytes of UTF-8 per token for Latin text; multi-byte scripts such as
+    # Arabic come out proportionally higher, which errs on the safe side
+    return (len(text.encode("utf-8")) + 3) // 4
+
+
+def truncate_tokens(text, max_tokens, endpoint="", part=""):
+    """Cut `text` to at most `max_tokens`, marking the cut"""
+    text = text or ""
+    if count_tokens(text) <= max_tokens:
+        return text
+    PROMPT_TRUNCATIONS.inc(endpoint, part)
+    keep = max(0, max_tokens - count_tokens(TRUNCATION_MARKER))
+    encoding = _get_encoding()
+    if encoding is not None:
+        head = encoding.decode(encoding.encode(text)[:keep])
+    else:
+        head = text.encode("utf-8")[:keep * 4].decode("utf-8", "ignore")
+    return head.rstrip() + TRUNCATION_MARKER
+
+
+def _field(value, endpoint, name):
+    return truncate_tokens(" ".join(str(value).split()), PROMPT_FIELD_TOKENS, endpoint, name)
+
+
+def _record(endpoint, messages):
+    PROMPT_TOKENS.observe(sum(count_tokens(m["content"]) for m in messages), endpoint)
+    return messages
+
+
+# ============================================================================
+# SELF-STUDY LESSON
+# ============================================================================
+SELF_LESSON_SYSTEM_PROMPT = """You are an educational AI tutor that creates engaging lessons.
+
+Create an engaging, interactive self-study lesson on the topic the student gives, written in their language.
+
+LESSON REQUIREMENTS:
+1. Use RICH MARKDOWN formatting with headers, bullet points, tables, and emphasis
+2. Include interactive elements like "Try It Yourself" sections
+3. Add practical examples and real-world applications
+4. Include knowledge checks and reflection questions
+5. Make it visually appealing and easy to follow
+
+FORMAT USING THIS MARKDOWN STRUCTURE:
+# 🎯 [Topic]: Comprehensive Guide
+
+## 📖 Introduction
+[Engaging introduction with emojis]
+
+## 🎓 Key Concepts
+### 🔍 Main Idea 1
+- **Explanation**: [Clear description]
+- **Example**: [Practical example]
+- **💡 Pro Tip**: [Helpful hint]
+
+### 🔍 Main Idea 2
+- **Explanation**: [Clear description]
+- **Example**: [Practical example]
+- **💡 Pro Tip**: [Helpful hint]
+
+## 🛠️ Practical Application
+### 🎯 Try It Yourself
+[Interactive exercise or thought experiment]
+
+### 🌍 Real-World Example
+[How this is used in real life]
+
+## 📊 Quick Reference
+| Concept | Definition | Example |
+|---------|------------|---------|
+[Table with key concepts]
+
+## 🤔 Knowledge Check
+### ❓ Reflection Questions
+1. [Thought-provoking question 1]
+2. [Thought-provoking question 2]
+
+### 🎯 Self-Assessment
+- [ ] I understand the basic concepts
+- [ ] I can explain it to someone else
+- [ ] I can apply it in practice
+
+## 🚀 Next Steps
+[Suggestions for further learning]
+
+Make the lesson engaging, use emojis appropriately, and include interactive elements throughout."""
+
+
+def build_self_lesson_messages(data):
+    endpoint = "self_lesson"
+    topic = _field(data.topic, endpoint, "topic")
+    language = _field(data.language, endpoint, "language")
+    return _record(endpoint, [
+        {"role": "system", "content": SELF_LESSON_SYSTEM_PROMPT},
+        {"role": "user", "content": f"""Create the lesson about '{topic}' in {language}.
+
+STUDENT PROFILE:
+- Level: {_field(data.rank, endpoint, "rank")}
+- Difficulty: {int(data.level)}
+- Language: {language}"""},
+    ])
+
+
+# ============================================================================
+# ASSISTED LESSON
+# ============================================================================
+ASSISTED_LESSON_SYSTEM_PROMPT = """You are an educational AI tutor that outputs only valid JSON.
+
+Create a short lesson on the topic the student gives, for their level.
+
+LESSON REQUIREMENTS:
+- Create a brief, engaging lesson (2-3 paragraphs)
+- Include exactly 3 multiple-choice questions about the lesson
+- Write in the requested language and match the requested difficulty
+
+RESPONSE FORMAT - RETURN ONLY VALID JSON, NO OTHER TEXT:
+{
+  "lesson": "Lesson content here...",
+  "quiz": [
+    {
+      "q": "Question 1?",
+      "options": ["Option A", "Option B", "Option C", "Option D"],
+      "answer": "Option A"
+    },
+    {
+      "q": "Question 2?",
+      "options": ["Option A", "Option B", "Option C", "Option D"],
+      "answer": "Option B"
+    },
+    {
+      "q": "Question 3?",
+      "options": ["Option A", "Option B", "Option C", "Option D"],
+      "answer": "Option C"
+    }
+  ]
+}
+
+IMPORTANT: Return ONLY the JSON object, no additional text or explanations."""
+
+
+def build_assisted_lesson_messages(data):
+    endpoint = "assisted_lesson"
+    return _record(endpoint, [
+        {"role": "system", "content": ASSISTED_LESSON_SYSTEM_PROMPT},
+        {"role": "user", "content": f"""Create a short lesson about '{_field(data.topic, endpoint, "topic")}' for a {_field(data.rank, endpoint, "rank")} level student.
+- Difficulty level: {int(data.level)}
+- Language: {_field(data.language, endpoint, "language")}"""},
+    ])
+
+
+# ============================================================================
+# QUIZ TOP-UP (questions missing after JSON repair)
+# ============================================================================
+QUIZ_TOPUP_SYSTEM_PROMPT = """You are an educational AI tutor that outputs only valid JSON.
+
+Write the requested number of new multiple-choice questions. Each has exactly 4 distinct options and an answer that is one of them, copied exactly. Do not repeat the questions listed as already asked.
+
+RESPONSE FORMAT - RETURN ONLY VALID JSON, NO OTHER TEXT OR COMMENTS:
+{"quiz": [{"q": "Question?", "options": ["Option A", "Option B", "Option C", "Option D"], "answer": "Option A"}]}"""
+
+QUIZ_TOPUP_CONTEXT_TOKENS = int(os.environ.get("QUIZ_TOPUP_CONTEXT_TOKENS", "800"))
+
+
+def build_quiz_topup_messages(endpoint, count, language, existing, topic=None, lesson=None):
+    """Ask for `count` more questions about a lesson (or a topic) only"""
+    if lesson:
+        subject = "this lesson:\n" + truncate_tokens(lesson, QUIZ_TOPUP_CONTEXT_TOKENS, endpoint, "topup_lesson")
+    elif topic:
+        subject = f"'{_field(topic, endpoint, 'topic')}'"
+    else:
+        subject = "general knowledge (fun trivia)"
+    asked = "\n".join(f"- {truncate_tokens(q, 40, endpoint, 'topup_asked')}" for q in existing) or "- none"
+    return _record(endpoint, [
+        {"role": "system", "content": QUIZ_TOPUP_SYSTEM_PROMPT},
+        {"role": "user", "content": f"""Write {int(count)} question(s) in {_field(language, endpoint, "language")} about {subject}
+
+Already asked:
+{asked}"""},
+    ])
+
+
+# ============================================================================
+# CHAT TUTOR
+# ============================================================================
+CHAT_SYSTEM_PROMPT = "You are a friendly educational tutor."
+
+
+def build_chat_system_prompt(lesson_content, language):
+    """
+    Identical on every turn of a conversation and forms the reusable
+    prefix. Inputs are cut to budget first, so the cache holds at most
+    CHAT_LESSON_TOKENS of lesson per entry whatever the client sent.
+    """
+    lesson = truncate_tokens(lesson_content, CHAT_LESSON_TOKENS, "chat", "lesson")
+    return _chat_system_prompt(lesson, _field(language, "chat", "language"))
+
+
+@functools.lru_cache(maxsize=256)
+def _chat_system_prompt(lesson, language):
+    return f"""{CHAT_SYSTEM_PROMPT}
+Use this lesson for context:
+{lesson if lesson else "No specific lesson context provided."}
+
+Language: {language}
+
+Provide a helpful, educational response. Keep it clear and engaging."""
+
+
+def compact_history(turns, max_tokens):
+    """
+    Older turns that no longer fit, condensed locally (no extra model call)
+    into a note listing what the student asked about.
+    """
+    questions = [t["content"] for t in turns if t["role"] == "user"]
+    if not questions or max_tokens <= 0:
+        return None
+    note = "Earlier in this conversation the student asked about: " + "; ".join(
+        truncate_tokens(" ".join(q.split()), 24, "chat", "summary_item") for q in questions)
+    return truncate_tokens(note, max_tokens, "chat", "summary")
+
+
+def build_chat_messages(lesson_content, language, history, message):
+    """
+    System prompt, then as many of the newest turns as fit in
+    CHAT_PROMPT_BUDGET, then the new message. Turns that don't fit are
+    compacted into a short note.
+    """
+    system = {"role": "system", "content": build_chat_system_prompt(lesson_content or "", language or "English")}
+    user = {"role": "user", "content": truncate_tokens(message, CHAT_MESSAGE_TOKENS, "chat", "message")}
+    remaining = CHAT_PROMPT_BUDGET - count_tokens(system["content"]) - count_tokens(user["content"])
+
+    turns = list(history)
+    kept = []
+    history_budget = remaining - CHAT_SUMMARY_TOKENS
+    # Walk back from the newest turn, keeping whole user/assistant pairs
+    index = len(turns)
+    while index > 0:
+        start = index - 2 if index >= 2 and turns[index - 2]["role"] == "user" else index - 1
+        cost = sum(count_tokens(t["content"]) for t in turns[start:index])
+        if cost > history_budget:
+            break
+        history_budget -= cost
+        kept[:0] = turns[start:index]
+        index = start
+
+    messages = [system]
+    if index > 0:
+        PROMPT_TRUNCATIONS.inc("chat", "history")
+        note = compact_history(turns[:index], CHAT_SUMMARY_TOKENS)
+        if note:
+            messages.append({"role": "system", "content": note})
+    messages.extend(kept)
+    messages.append(user)
+    return _record("chat", messages)
@@ -0,0 +1,249 @@
+# resilience.py - Deadlines, circuit breaker and hedged requests for LLM calls
+import asyncio
+import os
+import time
+from collections import deque
+
+from metrics import LLM_RESILIENCE, gauge_lines, registry
+
+# Per-endpoint deadlines in seconds; override with LLM_DEADLINE_<ENDPOINT>,
+# e.g. LLM_DEADLINE_CHAT=10. Streams use theirs for the first token.
+DEFAULT_DEADLINES = {
+    "assisted_lesson": 20.0,
+    "self_lesson": 30.0,
+    "chat": 15.0,
+    "trivia": 30.0,
+    "self_lesson_stream": 10.0,
+    "assisted_lesson_stream": 10.0,
+    "chat_stream": 8.0,
+    "quiz_topup": 15.0,
+}
+DEFAULT_DEADLINE = float(os.environ.get("LLM_DEADLINE_DEFAULT", "45"))
+# Longest pause allowed between two streamed chunks
+LLM_STREAM_IDLE_TIMEOUT = float(os.environ.get("LLM_STREAM_IDLE_TIMEOUT", "15"))
+
+# Interactive, non-streamed calls may send a second request once the first
+# is slower than that endpoint's recent p95
+LLM_HEDGE_ENABLED = os.environ.get("LLM_HEDGE", "1") == "1"
+HEDGED_ENDPOINTS = {"assisted_lesson", "self_lesson", "chat"}
+LLM_HEDGE_MIN_SAMPLES = int(os.environ.get("LLM_HEDGE_MIN_SAMPLES", "20"))
+LLM_HEDGE_MIN_DELAY = float(os.environ.get("LLM_HEDGE_MIN_DELAY", "1"))
+LLM_HEDGE_MAX_RATIO = float(os.environ.get("LLM_HEDGE_MAX_RATIO", "0.1"))
+
+# Nobody is waiting on these, so a slow success is not held against the
+# shared breaker; their errors and timeouts still are
+BACKGROUND_ENDPOINTS = {"trivia", "prefetch_assisted", "prefetch_self", "quiz_topup"}
+
+LLM_BREAKER_WINDOW = int(os.environ.get("LLM_BREAKER_WINDOW", "20"))
+LLM_BREAKER_MIN_CALLS = int(os.environ.get("LLM_BREAKER_MIN_CALLS", "10"))
+LLM_BREAKER_FAILURE_RATIO = float(os.environ.get("LLM_BREAKER_FAILURE_RATIO", "0.5"))
+LLM_BREAKER_OPEN_SECONDS = float(os.environ.get("LLM_BREAKER_OPEN_SECONDS", "30"))
+
+
+class UpstreamUnavailable(Exception):
+    """The call was not made or not finished in time: serve the fallback"""
+
+
+class CircuitOpen(UpstreamUnavailable):
+    pass
+
+
+class DeadlineExceeded(UpstreamUnavailable):
+    pass
+
+
+class CircuitBreaker:
+    """
+    Opens when, over the last `window` calls, at least `failure_ratio` of
+    them failed, timed out or (for interactive endpoints) were slower than
+    their endpoint allows. While open every call is rejected at once; after
+    `open_seconds` one probe is let through and its outcome closes or
+    re-opens the breaker.
+    """
+
+    CLOSED, HALF_OPEN, OPEN = "closed", "half_open", "open"
+
+    def __init__(self, window=LLM_BREAKER_WINDOW, min_calls=LLM_BREAKER_MIN_CALLS,
+                 failure_ratio=LLM_BREAKER_FAILURE_RATIO, open_seconds=LLM_BREAKER_OPEN_SECONDS):
+        self.min_calls = min_calls
+        self.failure_ratio = failure_ratio
+        self.open_seconds = open_seconds
+        self.state = self.CLOSED
+        self._outcomes = deque(maxlen=window)  # True = failure
+        self._opened_at = 0.0
+        self._probing = False
+        self.opened = 0
+
+    def allow(self):
+        if self.state == self.CLOSED:
+            return True
+        if self.state == self.OPEN and time.monotonic() - self._opened_at >= self.open_seconds:
+            self.state = self.HALF_OPEN
+            self._probing = False
+        if self.state == self.HALF_OPEN and not self._probing:
+            self._probing = True
+            return True
+        return False
+
+    def record(self, failed):
+        if self.state == self.HALF_OPEN:
+            if failed:
+                self._open()
+            else:
+                self.state = self.CLOSED
+                self._outcomes.clear()
+            self._probing = False
+            return
+
+        self._outcomes.append(failed)
+        if (len(self._outcomes) >= self.min_calls
+                and sum(self._outcomes) / len(self._outcomes) >= self.failure_ratio):
+            self._open()
+
+    def release(self):
+        """The call was abandoned by its caller: let another probe through"""
+        self._probing = False
+
+    def _open(self):
+        self.state = self.OPEN
+        self._opened_at = time.monotonic()
+        self._outcomes.clear()
+        self.opened += 1
+        print(f"⚠️ OpenRouter circuit breaker opened for {self.open_seconds:.0f}s")
+
+
+class LatencyWindow:
+    def __init__(self, size=200):
+        self._samples = deque(maxlen=size)
+
+    def add(self, seconds):
+        self._samples.append(seconds)
+
+    def percentile(self, pct):
+        if not self._samples:
+            return None
+        ordered = sorted(self._samples)
+        return ordered[min(len(ordered) - 1, int(pct / 100 * len(ordered)))]
+
+    def __len__(self):
+        return len(self._samples)
+
+
+class Policy:
+    def __init__(self, endpoint, breaker):
+        self.endpoint = endpoint
+        self.breaker = breaker
+        default = DEFAULT_DEADLINES.get(endpoint, DEFAULT_DEADLINE)
+        self.deadline = float(os.environ.get(f"LLM_DEADLINE_{endpoint.upper()}", default))
+        # Calls slower than this count against the breaker even if they succeed
+        self.slow_call = None if endpoint in BACKGROUND_ENDPOINTS else self.deadline / 2
+        self.hedge = LLM_HEDGE_ENABLED and endpoint in HEDGED_ENDPOINTS
+        self.latency = LatencyWindow()
+        self.calls = 0
+        self.hedges = 0
+
+    def hedge_delay(self):
+        if not self.hedge or len(self.latency) < LLM_HEDGE_MIN_SAMPLES:
+            return None
+        if self.hedges >= LLM_HEDGE_MAX_RATIO * self.calls:
+            return None
+        return max(LLM_HEDGE_MIN_DELAY, self.latency.percentile(95))
+
+    def admit(self):
+        if not self.breaker.allow():
+            LLM_RESILIENCE.inc(self.endpoint, "rejected")
+            raise CircuitOpen(f"{self.endpoint}: upstream circuit open")
+        self.calls += 1
+
+    def record(self, seconds, failed):
+        if not failed:
+            self.latency.add(seconds)
+        self.breaker.record(failed or (self.slow_call is not None and seconds > self.slow_call))
+
+    async def call(self, make_call):
+        """Run `make_call()` within the deadline, hedging once if it lags"""
+        self.admit()
+        loop = asyncio.get_running_loop()
+        started = loop.time()
+        deadline_at = started + self.deadline
+        hedge_delay = self.hedge_delay()
+        hedge_at = started + hedge_delay if hedge_delay is not None else None
+
+        first = asyncio.ensure_future(make_call())
+        pending = {first}
+        error = None
+        try:
+            while pending:
+                now = loop.time()
+                if now >= deadline_at:
+                    break
+                timeout = deadline_at - now
+                if hedge_at is not None:
+                    timeout = min(timeout, max(0.0, hedge_at - now))
+                done, pending = await asyncio.wait(pending, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        if task is not first:
+                            LLM_RESILIENCE.inc(self.endpoint, "hedge_won")
+                        self.record(loop.time() - started, failed=False)
+                        return task.result()
+                    error = task.exception()
+                if not done and hedge_at is not None and loop.time() >= hedge_at:
+                    hedge_at = None
+                    self.hedges += 1
+                    LLM_RESILIENCE.inc(self.endpoint, "hedged")
+                    pending.add(asyncio.ensure_future(make_call()))
+        except asyncio.CancelledError:
+            self.breaker.release()
+            raise
+        finally:
+            for task in pending:
+                task.cancel()
+                task.add_done_callback(_consume)
+
+        self.record(loop.time() - started, failed=True)
+        if error is not None and not pending:
+            raise error
+        LLM_RESILIENCE.inc(self.endpoint, "deadline_exceeded")
+        raise DeadlineExceeded(f"{self.endpoint}: no response within {self.deadline:.0f}s")
+
+    def stats(self):
+        return {
+            "deadline": self.deadline,
+            "hedge": self.hedge,
+            "calls": self.calls,
+            "hedges": self.hedges,
+            "p95": self.latency.percentile(95),
+        }
+
+
+def _consume(task):
+    if not task.cancelled():
+        task.exception()
+
+
+breaker = CircuitBreaker()
+_policies = {}
+
+
+def policy_for(endpoint):
+    policy = _policies.get(endpoint)
+    if policy is None:
+        policy = _policies[endpoint] = Policy(endpoint, breaker)
+    return policy
+
+
+def stats():
+    return {
+        "breaker": {"state": breaker.state, "opened": breaker.opened},
+        "endpoints": {name: policy.stats() for name, policy in _policies.items()},
+    }
+
+
+def _collect():
+    states = (CircuitBreaker.CLOSED, CircuitBreaker.HALF_OPEN, CircuitBreaker.OPEN)
+    return gauge_lines("llm_breaker_state", "OpenRouter circuit breaker (1 = current state)",
+                       [((state,), int(breaker.state == state)) for state in states], ("state",))
+
+
+registry.add_collector(_collect)
@@ -0,0 +1,35 @@
+# serialization.py - Fast JSON responses (orjson when installed)
+import functools
+import json
+
+from fastapi.responses import JSONResponse
+
+try:
+    import orjson
+    from fastapi.responses import ORJSONResponse as DefaultJSONResponse
+except ImportError:
+    orjson = None
+    DefaultJSONResponse = JSONResponse
+    print("⚠️ orjson not installed - using the stdlib JSON encoder")
+
+
+def dump_json(payload):
+    """Compact UTF-8 JSON bytes, as the response class would render them"""
+    if orjson is not None:
+        return orjson.dumps(payload, option=orjson.OPT_NON_STR_KEYS)
+    return json.dumps(payload, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+def direct_json(endpoint):
+    """
+    Return an async endpoint's dict/list result as a response right away.
+    FastAPI otherwise walks it through jsonable_encoder first, which costs
+    more than the orjson encoding itself on nested quiz payloads.
+    """
+    @functools.wraps(endpoint)
+    async def wrapper(*args, **kwargs):
+        result = await endpoint(*args, **kwargs)
+        if isinstance(result, (dict, list)):
+            return DefaultJSONResponse(result)
+        return result
+    return wrapper
@@ -0,0 +1,42 @@
+# singleflight.py - Coalesce identical in-flight async calls
+import asyncio
+
+
+class SingleFlight:
+    """
+    Run at most one call per key at a time. Callers that arrive while a
+    call for the same key is in flight await that call instead of starting
+    their own, and receive the same result (or the same exception).
+    """
+
+    def __init__(self):
+        self._inflight = {}
+        self.calls = 0
+        self.coalesced = 0
+
+    async def do(self, key, fn):
+        task = self._inflight.get(key)
+        if task is None:
+            self.calls += 1
+            task = asyncio.ensure_future(fn())
+            self._inflight[key] = task
+            task.add_done_callback(lambda t: self._finished(key, t))
+        else:
+            self.coalesced += 1
+
+        # Shielded so one cancelled caller doesn't cancel the shared call
+        return await asyncio.shield(task)
+
+    def _finished(self, key, task):
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+        # Mark the exception as retrieved even if every caller went away
+        if not task.cancelled():
+            task.exception()
+
+    def stats(self):
+        return {
+            "in_flight": len(self._inflight),
+            "upstream_calls": self.calls,
+            "coalesced": self.coalesced,
+        }
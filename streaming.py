@@ -0,0 +1,154 @@
+# streaming.py - Helpers for streamed responses (Server-Sent Events, NDJSON)
+import bisect
+import json
+
+from fastapi.responses import StreamingResponse
+
+from json_repair import parse_lenient
+from serialization import dump_json
+
+SSE_HEADERS = {
+    "Cache-Control": "no-cache",
+    "X-Accel-Buffering": "no",  # stop proxies from buffering the stream
+}
+
+
+def sse_event(data, event=None):
+    """Format one SSE frame; data is JSON-encoded so newlines are safe"""
+    frame = f"event: {event}\n" if event else ""
+    return frame + f"data: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+def sse_response(events):
+    """Wrap an async generator of SSE frames in a streaming response"""
+    return StreamingResponse(events, media_type="text/event-stream", headers=SSE_HEADERS)
+
+
+def ndjson_line(data):
+    """One JSON document per line"""
+    return dump_json(data) + b"\n"
+
+
+def ndjson_response(lines):
+    """Wrap an async generator of NDJSON lines in a streaming response"""
+    return StreamingResponse(lines, media_type="application/x-ndjson", headers=SSE_HEADERS)
+
+
+async def stream_completion_text(stream):
+    """Yield the text deltas of an OpenAI-compatible streamed completion"""
+    async for chunk in stream:
+        if not chunk.choices:
+            continue
+        delta = chunk.choices[0].delta.content
+        if delta:
+            yield delta
+
+
+class JsonStreamParser:
+    """
+    Incremental parser for a streamed JSON object (e.g. a completion in JSON
+    mode). feed() returns (path, value) for every value that has just been
+    closed, up to `max_depth` below the root: ("lesson",) once the lesson
+    string ends, ("quiz", 0) once the first quiz object ends, and finally
+    () for the whole document. Text before the first brace (a stray code
+    fence or preamble) is skipped.
+    """
+
+    def __init__(self, max_depth=2):
+        self.max_depth = max_depth
+        self.done = False
+        self._pos = 0
+        # Chunks are kept as received (with their offsets) rather than
+        # concatenated, so a long completion is not copied on every feed()
+        self._chunks = []
+        self._starts = []
+        self._stack = []  # frames: {"kind", "path", "start", "key", "index", "expect_key"}
+        self._in_string = False
+        self._escape = False
+        self._string_start = 0
+
+    @property
+    def text(self):
+        """Everything fed so far"""
+        if len(self._chunks) > 1:
+            self._chunks, self._starts = ["".join(self._chunks)], [0]
+        return self._chunks[0] if self._chunks else ""
+
+    def _slice(self, start, end):
+        """text[start:end], joining only the chunks it spans"""
+        first = bisect.bisect_right(self._starts, start) - 1
+        offset = self._starts[first]
+        return "".join(self._chunks[first:])[start - offset:end - offset]
+
+    def _child_path(self):
+        frame = self._stack[-1]
+        if frame["kind"] == "{":
+            return frame["path"] + (frame["key"],)
+        return frame["path"] + (frame["index"],)
+
+    def _complete(self, path, start, end, events):
+        if len(path) > self.max_depth:
+            return
+        try:
+            value = json.loads(self._slice(start, end))
+        except json.JSONDecodeError:
+            # e.g. a trailing comma inside one quiz object: repair it, or
+            # skip the event and keep reading the stream
+            try:
+                value, _ = parse_lenient(self._slice(start, end))
+            except ValueError:
+                return
+        events.append((path, value))
+
+    def feed(self, chunk):
+        """Scan only the new chunk; earlier text is never rescanned"""
+        events = []
+        if not chunk:
+            return events
+        base = self._pos
+        self._chunks.append(chunk)
+        self._starts.append(base)
+        for i, c in enumerate(chunk, base):
+            if self.done:
+                break
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif c == "\\":
+                    self._escape = True
+                elif c == '"':
+                    self._in_string = False
+                    frame = self._stack[-1]
+                    if frame["kind"] == "{" and frame["expect_key"]:
+                        frame["key"] = json.loads(self._slice(self._string_start, i + 1))
+                    else:
+                        self._complete(self._child_path(), self._string_start, i + 1, events)
+                continue
+
+            if not self._stack:
+                if c == "{" or c == "[":
+                    self._stack.append({"kind": c, "path": (), "start": i, "key": None,
+                                        "index": 0, "expect_key": c == "{"})
+                continue
+
+            frame = self._stack[-1]
+            if c == '"':
+                self._in_string = True
+                self._string_start = i
+            elif c == "{" or c == "[":
+                self._stack.append({"kind": c, "path": self._child_path(), "start": i, "key": None,
+                                    "index": 0, "expect_key": c == "{"})
+            elif c == "}" or c == "]":
+                self._stack.pop()
+                self._complete(frame["path"], frame["start"], i + 1, events)
+                self.done = not self._stack
+            elif c == ":":
+                frame["expect_key"] = False
+            elif c == ",":
+                if frame["kind"] == "{":
+                    frame["expect_key"] = True
+                    frame["key"] = None
+                else:
+                    frame["index"] += 1
+        self._pos = base + len(chunk)
+        return events
@@ -0,0 +1,15 @@
+# tests/test_json_repair.py - Quiz answers normalized against their options
+from json_repair import validate_question
+
+
+def test_numeric_answer_matching_an_option_is_kept():
+    question = validate_question({"q": "1+1?", "options": [1, 2, 3, 4], "answer": 2})
+
+    assert question["answer"] == "2"
+
+
+def test_index_and_letter_answers_map_to_their_option():
+    options = ["red", "green", "blue", "pink"]
+
+    assert validate_question({"q": "Sky?", "options": options, "answer": 2})["answer"] == "blue"
+    assert validate_question({"q": "Sky?", "options": options, "answer": "c"})["answer"] == "blue"
@@ -0,0 +1,41 @@
+# tests/test_model_router.py - Routing when candidates fail
+import model_router
+from model_router import LLM_ROUTER_MIN_SAMPLES, ModelRouter
+
+
+def _router(monkeypatch, endpoint, models):
+    monkeypatch.setenv(f"LLM_MODELS_{endpoint.upper()}", ",".join(models))
+    monkeypatch.setattr(model_router, "LLM_ROUTER_EXPLORE", 0.0)
+    return ModelRouter("default-model")
+
+
+def test_errored_model_without_latency_is_routed_around(monkeypatch):
+    router = _router(monkeypatch, "chat", ["big", "small"])
+    for _ in range(LLM_ROUTER_MIN_SAMPLES):
+        router.observe("chat", "big", 0.01, "error")
+        router.observe("chat", "small", 0.2, "ok")
+
+    assert router.choose("chat") == "small"
+
+
+def test_endpoint_where_every_call_fails_keeps_routing(monkeypatch):
+    router = _router(monkeypatch, "trivia", ["big", "small"])
+    for _ in range(LLM_ROUTER_MIN_SAMPLES * 2):
+        for model in ("big", "small"):
+            router.observe("trivia", model, 0.01, "error")
+
+    for _ in range(10):
+        assert router.choose("trivia") in ("big", "small")
+    assert router.stats()["trivia"]["last"]["reason"] == "fastest"
+
+
+def test_cancelled_calls_do_not_pull_latency_down(monkeypatch):
+    router = _router(monkeypatch, "chat", ["slow", "fast"])
+    for _ in range(LLM_ROUTER_MIN_SAMPLES):
+        router.observe("chat", "slow", 10.0, "ok")
+        router.observe("chat", "fast", 1.0, "ok")
+    for _ in range(LLM_ROUTER_MIN_SAMPLES * 10):
+        router.observe("chat", "slow", 0.05, "cancelled")
+
+    assert router.stats()["chat"]["models"]["slow"]["p50"] == 10.0
+    assert router.choose("chat") == "fast"
@@ -0,0 +1,20 @@
+# tests/test_resilience.py - What counts against the shared circuit breaker
+from resilience import CircuitBreaker, Policy
+
+
+def test_slow_background_successes_leave_the_breaker_closed():
+    breaker = CircuitBreaker(window=20, min_calls=10)
+    trivia = Policy("trivia", breaker)
+    for _ in range(20):
+        trivia.record(trivia.deadline * 0.9, failed=False)
+
+    assert breaker.state == CircuitBreaker.CLOSED
+
+
+def test_slow_interactive_successes_open_the_breaker():
+    breaker = CircuitBreaker(window=20, min_calls=10)
+    chat = Policy("chat", breaker)
+    for _ in range(10):
+        chat.record(chat.deadline * 0.9, failed=False)
+
+    assert breaker.state == CircuitBreaker.OPEN
@@ -0,0 +1,22 @@
+# tests/test_streaming.py - Incremental JSON parsing across chunk boundaries
+import json
+
+from streaming import JsonStreamParser
+
+
+def test_events_do_not_depend_on_chunk_size():
+    document = json.dumps({
+        "lesson": 'A "quoted" lesson\n' * 20,
+        "quiz": [{"q": f"Q{i}?", "options": ["a", "b", "c", "d"], "answer": "a"} for i in range(3)],
+    })
+    expected = None
+    for size in (1, 3, 64, len(document)):
+        parser = JsonStreamParser()
+        events = []
+        for i in range(0, len(document), size):
+            events += parser.feed(document[i:i + size])
+
+        assert parser.done and parser.text == document
+        expected = expected or events
+        assert events == expected
+    assert [path for path, _ in expected] == [("lesson",), ("quiz", 0), ("quiz", 1), ("quiz", 2), ("quiz",), ()]
@@ -0,0 +1,61 @@
+# tokens.py - Stateless HMAC-signed session tokens
+import base64
+import hashlib
+import hmac
+import json
+import os
+import secrets
+import time
+
+SESSION_TOKEN_TTL = int(os.environ.get("SESSION_TOKEN_TTL", str(7 * 24 * 3600)))
+
+SESSION_SECRET = os.environ.get("SESSION_SECRET")
+if not SESSION_SECRET:
+    # Tokens then only survive until restart and only work on this worker
+    print("⚠️ WARNING: SESSION_SECRET not set - using a random per-process secret")
+    SESSION_SECRET = secrets.token_urlsafe(32)
+
+_KEY = SESSION_SECRET.encode("utf-8")
+
+
+class InvalidToken(Exception):
+    pass
+
+
+def _b64encode(raw):
+    return base64.urlsafe_b64encode(raw).rstrip(b"=").decode("ascii")
+
+
+def _b64decode(text):
+    return base64.urlsafe_b64decode(text + "=" * (-len(text) % 4))
+
+
+def _sign(payload):
+    return _b64encode(hmac.new(_KEY, payload.encode("utf-8"), hashlib.sha256).digest())
+
+
+def issue_token(user_id, username, rank, ttl=SESSION_TOKEN_TTL):
+    """Return `<payload>.<signature>` carrying the user id, username and rank"""
+    claims = {"uid": user_id, "usr": username, "rnk": rank, "exp": int(time.time()) + ttl}
+    payload = _b64encode(json.dumps(claims, separators=(",", ":")).encode("utf-8"))
+    return f"{payload}.{_sign(payload)}"
+
+
+def verify_token(token):
+    """Return the token's claims, or raise InvalidToken"""
+    try:
+        payload, signature = token.split(".")
+    except ValueError:
+        raise InvalidToken("malformed token")
+
+    if not hmac.compare_digest(signature.encode("utf-8"), _sign(payload).encode("utf-8")):
+        raise InvalidToken("bad signature")
+
+    try:
+        claims = json.loads(_b64decode(payload))
+    except ValueError:
+        raise InvalidToken("malformed payload")
+
+    if claims.get("exp", 0) < time.time():
+        raise InvalidToken("token expired")
+    return claims
@@ -0,0 +1,124 @@
+# trivia_pool.py - Pre-generated trivia quizzes, refilled in the background
+import asyncio
+import os
+from collections import deque
+
+TRIVIA_POOL_WATERMARK = int(os.environ.get("TRIVIA_POOL_WATERMARK", "10"))
+TRIVIA_POOL_WORKERS = int(os.environ.get("TRIVIA_POOL_WORKERS", "2"))
+# Only these languages get a pool; requests for others are served the fallback
+TRIVIA_POOL_LANGUAGES = os.environ.get("TRIVIA_POOL_LANGUAGES", "English,Arabic")
+TRIVIA_POOL_RETRY_DELAY = float(os.environ.get("TRIVIA_POOL_RETRY_DELAY", "30"))
+
+
+class TriviaPool:
+    """
+    Per-language pool of ready-made trivia payloads. `take()` pops one in
+    O(1); background workers generate new ones until each language is back
+    at the watermark.
+    """
+
+    def __init__(self, generate, watermark=TRIVIA_POOL_WATERMARK,
+                 workers=TRIVIA_POOL_WORKERS, languages=TRIVIA_POOL_LANGUAGES):
+        self._generate = generate  # async fn(language) -> {"quiz": [...]}
+        self.watermark = watermark
+        self.workers = workers
+        self._pools = {}
+        self._languages = {}  # normalized key -> language name sent to the model
+        self._pending = {}
+        for language in languages.split(","):
+            if language.strip():
+                self._register(language)
+        self._queue = None
+        self._tasks = []
+        self.served = 0
+        self.empty = 0
+        self.generated = 0
+        self.failed = 0
+
+    @staticmethod
+    def _key(language):
+        return language.strip().casefold()
+
+    def _register(self, language):
+        key = self._key(language)
+        if key not in self._pools:
+            self._pools[key] = deque()
+            self._languages[key] = language.strip()
+            self._pending[key] = 0
+
+    def take(self, language):
+        """Pop a quiz for `language`, or None if it has no pool or it is empty"""
+        key = self._key(language)
+        pool = self._pools.get(key)
+        if pool is None:
+            # Not a configured language: never create a pool (or LLM calls) for it
+            self.empty += 1
+            return None
+
+        quiz = pool.popleft() if pool else None
+        if quiz is None:
+            self.empty += 1
+        else:
+            self.served += 1
+        self._schedule(key)
+        return quiz
+
+    def _schedule(self, key):
+        if not self._tasks:
+            return
+        missing = self.watermark - len(self._pools[key]) - self._pending[key]
+        for _ in range(max(0, missing)):
+            self._pending[key] += 1
+            self._queue.put_nowait(key)
+
+    async def _worker(self):
+        while True:
+            key = await self._queue.get()
+            failed = False
+            try:
+                quiz = await self._generate(self._languages[key])
+                if not isinstance(quiz, dict) or not quiz.get("quiz"):
+                    raise ValueError("generated trivia has no quiz items")
+                self._pools[key].append(quiz)
+                self.generated += 1
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                failed = True
+                self.failed += 1
+                print(f"⚠️ Trivia pool refill failed ({key}): {e}")
+            finally:
+                self._pending[key] -= 1
+                self._queue.task_done()
+
+            if failed:
+                # Back off instead of hammering a failing upstream
+                await asyncio.sleep(TRIVIA_POOL_RETRY_DELAY)
+                self._schedule(key)
+
+    def start(self):
+        if self._tasks:
+            return
+        self._queue = asyncio.Queue()
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+        for key in self._pools:
+            self._schedule(key)
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        self._queue = None
+        for key in self._pending:
+            self._pending[key] = 0
+
+    def stats(self):
+        return {
+            "watermark": self.watermark,
+            "sizes": {key: len(pool) for key, pool in self._pools.items()},
+            "served": self.served,
+            "empty": self.empty,
+            "generated": self.generated,
+            "failed": self.failed,
+        }